@@ -0,0 +1,65 @@
+"""
+Benchmark: koliko časa send_log doda posameznemu zahtevku.
+
+Primerja staro pot (nova pika povezava za vsak log) s publisherjem v ozadju.
+Potrebuje dosegljiv RabbitMQ (RABBITMQ_HOST/PORT/USER/PASS).
+
+    python bench_logger.py -n 2000
+"""
+import argparse
+import statistics
+import time
+
+import pika
+
+import logger
+
+
+def legacy_send_log(log_type, url, message, service, correlation_id):
+    connection = logger.get_rabbitmq_connection()
+    channel = connection.channel()
+    channel.exchange_declare(exchange=logger.EXCHANGE_NAME, exchange_type='direct', durable=True)
+    channel.queue_declare(queue=logger.QUEUE_NAME, durable=True)
+    channel.queue_bind(exchange=logger.EXCHANGE_NAME, queue=logger.QUEUE_NAME)
+    body = f"{log_type} {url} Correlation: {correlation_id} [{service}] - {message}"
+    channel.basic_publish(exchange=logger.EXCHANGE_NAME, routing_key=logger.QUEUE_NAME, body=body.encode('utf-8'))
+    connection.close()
+
+
+def measure(fn, n):
+    samples = []
+    for i in range(n):
+        start = time.perf_counter()
+        fn("INFO", "/menu", f"bench {i}", "bench-logger", "00000000-0000-0000-0000-000000000000")
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "mean_us": statistics.fmean(samples) * 1e6,
+        "p50_us": samples[len(samples) // 2] * 1e6,
+        "p99_us": samples[int(len(samples) * 0.99) - 1] * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=1000)
+    parser.add_argument("--legacy-n", type=int, default=200)
+    args = parser.parse_args()
+
+    try:
+        legacy = measure(legacy_send_log, args.legacy_n)
+        print(f"legacy (connection per log): {legacy}")
+    except pika.exceptions.AMQPError as e:
+        print(f"legacy (connection per log): broker unavailable ({e})")
+
+    current = measure(logger.send_log, args.n)
+    print(f"publisher (queued):          {current}")
+
+    start = time.perf_counter()
+    logger.publisher.flush(timeout=60)
+    print(f"drain of {args.n} logs: {time.perf_counter() - start:.3f}s, "
+          f"published={logger.publisher.published} dropped={logger.publisher.dropped}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+Indeksi MongoDB storitve naročanja hrane. Storitev jih ustvari ob zagonu (MONGO_ENSURE_INDEXES),
+ročno pa:
+
+    python indexes.py [--explain]
+"""
+from pymongo import ASCENDING, IndexModel
+
+from database import client, MONGO_DB
+from mongo_indexes import HotQuery, main
+
+INDEXES = {
+    "menu": [
+        IndexModel([("name", ASCENDING)], name="name"),
+        IndexModel([("veselica_id", ASCENDING)], name="veselica_id"),
+    ],
+    "orders": [
+        # Pokrije tudi poizvedbe le po user_id
+        IndexModel([("user_id", ASCENDING), ("paid", ASCENDING)], name="user_id_paid"),
+    ],
+}
+
+HOT_QUERIES = [
+    HotQuery("postavka po imenu", "menu", {"name": "x"}),
+    HotQuery("meni veselice", "menu", {"veselica_id": {"$in": ["x", None]}}),
+    HotQuery("narocila uporabnika", "orders", {"user_id": "x"}),
+    HotQuery("placana narocila", "orders", {"user_id": "x", "paid": True}),
+]
+
+
+if __name__ == "__main__":
+    main(client[MONGO_DB], INDEXES, HOT_QUERIES)
@@ -0,0 +1,161 @@
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+
+def parse_rates(value):
+    """'DEBUG=0.1,INFO=0.5' -> {'DEBUG': 0.1, 'INFO': 0.5}"""
+    rates = {}
+    for item in (value or '').split(','):
+        if '=' not in item:
+            continue
+        key, rate = item.rsplit('=', 1)
+        rates[key.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+def parse_limit(value):
+    """'5:20' -> (5.0, 20.0) (žetonov na sekundo, velikost vedra); samo '5' pomeni vedro 5"""
+    rate, _, burst = value.strip().partition(':')
+    rate = float(rate)
+    return rate, float(burst) if burst else max(rate, 1.0)
+
+
+def parse_limits(value):
+    """'/menu=5:20,/music/requests=2' -> {'/menu': (5.0, 20.0), '/music/requests': (2.0, 2.0)}"""
+    limits = {}
+    for item in (value or '').split(','):
+        if '=' not in item:
+            continue
+        route, limit = item.rsplit('=', 1)
+        limits[route.strip()] = parse_limit(limit)
+    return limits
+
+
+def parse_set(value):
+    return {item.strip() for item in (value or '').split(',') if item.strip()}
+
+
+class _TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class LogSampler:
+    """
+    Vzorčenje in omejevanje logov na strani producenta.
+
+    Log z nivojem iz `keep_levels` ali s correlation id iz `keep_correlation_ids` se vedno
+    ohrani. Ostali se ohranijo z verjetnostjo (stopnja za nivo) * (stopnja za URL), nato pa
+    jih omeji še token bucket za route. URL-ji se ujemajo po najdaljši predponi poti.
+
+    Zavržene loge štejemo po (nivo, route); `decide` za naslednji ohranjeni log istega
+    ključa vrne, koliko podobnih je bilo zavrženih od prejšnjega, da se števila dajo
+    rekonstruirati. Vrne None, če se log zavrže.
+    """
+
+    def __init__(self, level_rates=None, url_rates=None, route_limits=None, default_limit=None,
+                 keep_levels=('ERROR', 'CRITICAL'), keep_correlation_ids=(), max_keys=10000):
+        self.level_rates = dict(level_rates or {})
+        self.url_rates = dict(url_rates or {})
+        self.route_limits = dict(route_limits or {})
+        self.default_limit = default_limit
+        self.keep_levels = set(keep_levels)
+        self.keep_correlation_ids = set(keep_correlation_ids)
+        self.max_keys = max_keys
+
+        # Predpone urejene od najdaljše, da zmaga najbolj specifična
+        self._prefixes = sorted(set(self.url_rates) | set(self.route_limits), key=len, reverse=True)
+        self._buckets = {}
+        self._suppressed = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.kept = 0
+        self.suppressed = 0
+
+    @classmethod
+    def from_env(cls):
+        default_limit = os.getenv('LOG_ROUTE_RATE_LIMIT_DEFAULT')
+        return cls(
+            level_rates=parse_rates(os.getenv('LOG_SAMPLE_RATES')),
+            url_rates=parse_rates(os.getenv('LOG_URL_SAMPLE_RATES')),
+            route_limits=parse_limits(os.getenv('LOG_ROUTE_RATE_LIMITS')),
+            default_limit=parse_limit(default_limit) if default_limit else None,
+            keep_levels=parse_set(os.getenv('LOG_ALWAYS_KEEP_LEVELS', 'ERROR,CRITICAL')),
+            keep_correlation_ids=parse_set(os.getenv('LOG_KEEP_CORRELATION_IDS')),
+        )
+
+    @property
+    def enabled(self):
+        return bool(self.level_rates or self.url_rates or self.route_limits or self.default_limit)
+
+    def keep_correlation_id(self, correlation_id):
+        """Vse nadaljnje loge s tem correlation id ohrani (npr. pri razhroščevanju zahtevka)."""
+        self.keep_correlation_ids.add(correlation_id)
+
+    def route_for(self, url):
+        path = urlsplit(url).path if '://' in url else url.split('?', 1)[0]
+        for prefix in self._prefixes:
+            if path.startswith(prefix):
+                return prefix
+        return path
+
+    def decide(self, level, url, correlation_id):
+        if not self.enabled:
+            return 0
+        route = self.route_for(url or '')
+        key = (level, route)
+        with self._lock:
+            if level in self.keep_levels or correlation_id in self.keep_correlation_ids:
+                return self._keep(key)
+            rate = self.level_rates.get(level, 1.0) * self.url_rates.get(route, 1.0)
+            if rate < 1.0 and random.random() >= rate:
+                return self._suppress(key)
+            limit = self.route_limits.get(route, self.default_limit)
+            if limit is not None:
+                bucket = self._buckets.get(route)
+                if bucket is None:
+                    if len(self._buckets) >= self.max_keys:
+                        self._buckets.clear()
+                    bucket = self._buckets[route] = _TokenBucket(*limit)
+                if not bucket.take():
+                    return self._suppress(key)
+            return self._keep(key)
+
+    def _keep(self, key):
+        self.kept += 1
+        return self._suppressed.pop(key, 0)
+
+    def _suppress(self, key):
+        self.suppressed += 1
+        self._suppressed[key] = self._suppressed.pop(key, 0) + 1
+        if len(self._suppressed) > self.max_keys:
+            # Najdlje neaktivni ključ izgubi svoje štetje, da poraba pomnilnika ostane omejena
+            self._suppressed.popitem(last=False)
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "kept": self.kept,
+                "suppressed": self.suppressed,
+                "pending_suppressed": sum(self._suppressed.values()),
+            }
@@ -8,9 +8,12 @@ from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
 import os
 import requests
 from models import Order, StatusUpdate, Payment, MenuItem
-from database import orders_collection, menu_collection
+from database import client, MONGO_DB, orders_collection, menu_collection
+from indexes import INDEXES
+from mongo_indexes import MONGO_ENSURE_INDEXES, ensure_indexes
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from logger import send_log
+from logger import send_log, publisher
+from statistika_client import StatistikaMiddleware, statistika_buffer
 import uuid
 app = FastAPI(title="Food Ordering Microservice")
 
@@ -43,6 +46,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Statistika klicev po predlogi route in metodi (npr. "POST /orders")
+app.add_middleware(StatistikaMiddleware)
+
+@app.on_event("startup")
+def ustvari_indekse():
+    if MONGO_ENSURE_INDEXES:
+        try:
+            ensure_indexes(client[MONGO_DB], INDEXES)
+        except Exception as e:
+            print(f"Napaka pri ustvarjanju indeksov: {e}")
+
+@app.on_event("shutdown")
+def flush_logs():
+    publisher.flush()
+
+@app.on_event("shutdown")
+async def flush_statistika():
+    await statistika_buffer.stop()
+
 
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 JWT_ALGORITHM = "HS256"
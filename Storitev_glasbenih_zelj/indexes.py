@@ -0,0 +1,26 @@
+"""
+Indeksi MongoDB storitve glasbenih želja. Storitev jih ustvari ob zagonu (MONGO_ENSURE_INDEXES),
+ročno pa:
+
+    python indexes.py [--explain]
+"""
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from database import client, MONGO_DB
+from mongo_indexes import HotQuery, main
+
+INDEXES = {
+    "music_requests": [
+        IndexModel([("id_veselica", ASCENDING)], name="id_veselica"),
+        IndexModel([("votes", DESCENDING)], name="votes"),
+    ],
+}
+
+HOT_QUERIES = [
+    HotQuery("zelje veselice", "music_requests", {"id_veselica": "x"}),
+    HotQuery("najbolj priljubljene", "music_requests", {}, sort=[("votes", DESCENDING)], limit=10),
+]
+
+
+if __name__ == "__main__":
+    main(client[MONGO_DB], INDEXES, HOT_QUERIES)
@@ -0,0 +1,248 @@
+import glob
+import os
+import struct
+
+try:
+    import fcntl
+except ImportError:  # Windows: brez zaklepov, vsak proces ima le svoj podimenik
+    fcntl = None
+
+_HEADER = struct.Struct('>I')
+_LOCK_FILE = '.lock'
+
+
+class LogSpool:
+    """
+    Lokalni append-only spool za loge, ko RabbitMQ ni dosegljiv.
+
+    Zapisi (4 bajti dolžine + telo) se dodajajo v segmente `spool-<n>.log`, ki se
+    zamenjajo, ko presežejo `segment_bytes`. Skupna velikost je omejena z `max_bytes`;
+    ob prekoračitvi politika `oldest` zavrže najstarejše segmente, `newest` pa nove loge.
+    Razred ni varen za hkratno uporabo iz več niti.
+
+    Več procesov (workerjev) si lahko deli `directory`: vsak proces segmente piše v svoj
+    podimenik `worker-<pid>`, ki ga drži z zaklepom (flock). Ob zagonu proces najprej
+    prevzame podimenik procesa, ki ne teče več, in njegove loge pošlje sam. Po fork-u
+    otrok prevzame svoj podimenik. Število že poslanih zapisov segmenta hranimo v
+    `spool-<n>.offset`, da se ob napaki med pošiljanjem ne pošljejo znova od začetka.
+    """
+
+    def __init__(self, directory, segment_bytes=4 * 1024 * 1024, max_bytes=256 * 1024 * 1024,
+                 drop_policy='oldest'):
+        if drop_policy not in ('oldest', 'newest'):
+            raise ValueError("drop_policy mora biti 'oldest' ali 'newest'")
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.drop_policy = drop_policy
+        os.makedirs(directory, exist_ok=True)
+
+        self._file = None
+        self._file_path = None
+        self._pid = None
+        self._lock_file = None
+        self._worker_directory = None
+        self._next_seq = 0
+        self._bytes = 0
+        self.spooled = 0
+        self.replayed = 0
+        self.dropped = 0
+        self._ensure_claimed()
+
+    def _ensure_claimed(self):
+        if self._pid == os.getpid():
+            return
+        # Po fork-u datoteke in zaklep ostanejo staršu; otrok si vzame svoj podimenik
+        if self._file is not None:
+            self._file.close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+        self._file = None
+        self._file_path = None
+        self._lock_file = None
+        self._pid = os.getpid()
+        self._worker_directory, self._lock_file = self._claim()
+        segments = self._segments()
+        self._next_seq = self._seq(segments[-1]) + 1 if segments else 0
+        self._bytes = sum(os.path.getsize(path) for path in segments)
+
+    @staticmethod
+    def _try_lock(path):
+        lock_file = open(path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def _claim(self):
+        """Vrne (podimenik, odprta zaklenjena datoteka) za ta proces."""
+        own = os.path.join(self.directory, f'worker-{os.getpid()}')
+        if fcntl is None:
+            os.makedirs(own, exist_ok=True)
+            return own, None
+        with open(os.path.join(self.directory, _LOCK_FILE), 'a') as directory_lock:
+            # Prevzem podimenikov teče po en proces naenkrat
+            fcntl.flock(directory_lock, fcntl.LOCK_EX)
+            for candidate in sorted(glob.glob(os.path.join(self.directory, 'worker-*'))) + [own]:
+                os.makedirs(candidate, exist_ok=True)
+                lock_file = self._try_lock(os.path.join(candidate, _LOCK_FILE))
+                if lock_file is None:
+                    continue
+                if candidate == own or glob.glob(os.path.join(candidate, 'spool-*.log')):
+                    break
+                # Prazen podimenik končanega procesa pospravimo
+                lock_file.close()
+                for path in glob.glob(os.path.join(candidate, '*')) + [os.path.join(candidate, _LOCK_FILE)]:
+                    os.remove(path)
+                os.rmdir(candidate)
+            else:
+                raise OSError(f"Podimenika spoola v {self.directory} ni mogoče zakleniti")
+            # Segmenti iz časa, ko so si vsi procesi delili en imenik; dodamo jih za obstoječe
+            existing = sorted(glob.glob(os.path.join(candidate, 'spool-*.log')))
+            seq = self._seq(existing[-1]) + 1 if existing else 0
+            for path in sorted(glob.glob(os.path.join(self.directory, 'spool-*.log'))):
+                os.replace(path, os.path.join(candidate, f'spool-{seq:012d}.log'))
+                seq += 1
+        return candidate, lock_file
+
+    def _segments(self):
+        return sorted(glob.glob(os.path.join(self._worker_directory, 'spool-*.log')))
+
+    @staticmethod
+    def _seq(path):
+        return int(os.path.basename(path)[len('spool-'):-len('.log')])
+
+    def _close_current(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._file_path = None
+
+    def _open_new_segment(self):
+        self._close_current()
+        self._file_path = os.path.join(self._worker_directory, f'spool-{self._next_seq:012d}.log')
+        self._next_seq += 1
+        self._file = open(self._file_path, 'ab')
+
+    @staticmethod
+    def _read_records(path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        records = []
+        offset = 0
+        while offset + _HEADER.size <= len(data):
+            (length,) = _HEADER.unpack_from(data, offset)
+            offset += _HEADER.size
+            if offset + length > len(data):
+                # Nedokončan zapis (npr. ob sesutju procesa) ignoriramo
+                break
+            records.append(data[offset:offset + length])
+            offset += length
+        return records
+
+    @staticmethod
+    def _offset_path(path):
+        return path[:-len('.log')] + '.offset'
+
+    def _read_offset(self, path):
+        try:
+            with open(self._offset_path(path)) as f:
+                return int(f.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _drop_segment(self, path):
+        if path == self._file_path:
+            self._close_current()
+        self.dropped += max(len(self._read_records(path)) - self._read_offset(path), 0)
+        self._remove(path)
+
+    def _remove(self, path):
+        size = os.path.getsize(path)
+        os.remove(path)
+        self._bytes -= size
+        try:
+            os.remove(self._offset_path(path))
+        except FileNotFoundError:
+            pass
+
+    def has_data(self):
+        self._ensure_claimed()
+        return self._bytes > 0
+
+    def size(self):
+        self._ensure_claimed()
+        return self._bytes
+
+    def append(self, bodies):
+        """Zapiše loge na disk. Vrne False, če jih je politika omejitve zavrgla."""
+        if not bodies:
+            return True
+        self._ensure_claimed()
+        data = b''.join(_HEADER.pack(len(body)) + body for body in bodies)
+        if self._bytes + len(data) > self.max_bytes:
+            if self.drop_policy == 'newest':
+                self.dropped += len(bodies)
+                return False
+            for path in self._segments():
+                if self._bytes + len(data) <= self.max_bytes:
+                    break
+                self._drop_segment(path)
+            if self._bytes + len(data) > self.max_bytes:
+                self.dropped += len(bodies)
+                return False
+        if self._file is None or self._file.tell() >= self.segment_bytes:
+            self._open_new_segment()
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._bytes += len(data)
+        self.spooled += len(bodies)
+        return True
+
+    def oldest_segment(self):
+        """
+        Vrne (pot, zapisi) najstarejšega segmenta ali None, če je spool prazen.
+        Zapisi, že označeni z mark_replayed, so izpuščeni.
+        """
+        self._ensure_claimed()
+        segments = self._segments()
+        if not segments:
+            return None
+        path = segments[0]
+        if path == self._file_path:
+            # Segment, v katerega še pišemo, zapremo, da ga lahko varno preberemo
+            self._close_current()
+        return path, self._read_records(path)[self._read_offset(path):]
+
+    def mark_replayed(self, path, count):
+        """Zabeleži, da je bilo naslednjih `count` zapisov segmenta uspešno poslanih."""
+        offset = self._read_offset(path) + count
+        temporary = self._offset_path(path) + '.tmp'
+        with open(temporary, 'w') as f:
+            f.write(str(offset))
+        os.replace(temporary, self._offset_path(path))
+        self.replayed += count
+
+    def remove_segment(self, path):
+        """Odstrani segment, ko so bili vsi njegovi zapisi uspešno poslani."""
+        self._remove(path)
+
+    def close(self):
+        self._close_current()
+        if self._lock_file is not None and self._pid == os.getpid():
+            self._lock_file.close()
+            self._lock_file = None
+            self._pid = None
+
+    def stats(self):
+        return {
+            "directory": self._worker_directory,
+            "bytes": self._bytes,
+            "segments": len(self._segments()),
+            "spooled": self.spooled,
+            "replayed": self.replayed,
+            "dropped": self.dropped,
+        }
@@ -1,7 +1,16 @@
 # logger.py
-import pika
+import atexit
+import json
 import os
-from datetime import datetime
+import queue
+import tempfile
+import threading
+import time
+
+import pika
+
+from log_sampling import LogSampler
+from log_spool import LogSpool
 
 RABBITMQ_HOST = os.getenv('RABBITMQ_HOST', 'rabbitmq')
 RABBITMQ_PORT = int(os.getenv('RABBITMQ_PORT', 5672))
@@ -9,6 +18,23 @@ RABBITMQ_USER = os.getenv('RABBITMQ_USER', 'admin')
 RABBITMQ_PASS = os.getenv('RABBITMQ_PASS', 'secret')
 EXCHANGE_NAME = 'logging_exchange'
 QUEUE_NAME = 'logging_queue'
+LOG_ENVELOPE_VERSION = 1
+
+LOG_QUEUE_MAXSIZE = int(os.getenv('LOG_QUEUE_MAXSIZE', 10000))
+LOG_BATCH_SIZE = int(os.getenv('LOG_BATCH_SIZE', 200))
+LOG_FLUSH_INTERVAL = float(os.getenv('LOG_FLUSH_INTERVAL', 0.05))
+LOG_RECONNECT_MAX_DELAY = float(os.getenv('LOG_RECONNECT_MAX_DELAY', 30))
+LOG_SHUTDOWN_TIMEOUT = float(os.getenv('LOG_SHUTDOWN_TIMEOUT', 5))
+# Zavržene loge le preštejemo in število izpišemo največ enkrat na interval
+LOG_DROP_REPORT_INTERVAL = float(os.getenv('LOG_DROP_REPORT_INTERVAL', 10))
+# Docker slika nastavi /var/spool/logs na volumnu; v /tmp vsebnika spool ne preživi ponovnega ustvarjenja
+LOG_SPOOL_DIR = os.getenv('LOG_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'log_spool'))
+LOG_SPOOL_SEGMENT_BYTES = int(os.getenv('LOG_SPOOL_SEGMENT_BYTES', 4 * 1024 * 1024))
+LOG_SPOOL_MAX_BYTES = int(os.getenv('LOG_SPOOL_MAX_BYTES', 256 * 1024 * 1024))
+LOG_SPOOL_DROP_POLICY = os.getenv('LOG_SPOOL_DROP_POLICY', 'oldest')
+
+_STOP = object()
+
 
 def get_rabbitmq_connection():
     credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASS)
@@ -23,28 +49,273 @@ def get_rabbitmq_connection():
     return connection
 
 
+class LogPublisher:
+    """
+    Dolgoživ publisher logov: ena povezava na proces, omejena vrsta v pomnilniku
+    in nit v ozadju, ki sporočila pošilja v paketih. Vsak paket je ena transakcija AMQP
+    (tx_select/tx_commit): broker ga potrdi z enim povratnim klicem namesto s potrditvijo
+    vsakega sporočila posebej, ob napaki pa nepotrjenih sporočil ne obdrži, zato paket
+    ponovno pošljemo brez podvajanja.
 
-def send_log(log_type: str, url: str, message: str, service: str, correlation_id: str):
-    """Pošlji log v RabbitMQ"""
-    try:
-        connection = get_rabbitmq_connection()
-        channel = connection.channel()
+    Ko broker ni dosegljiv, se nit do naslednjega poskusa (z naraščajočim zamikom)
+    ne poskuša povezati, ampak loge zapisuje v lokalni spool in jih ob vrnitvi
+    brokerja ponovno pošlje.
+    """
+
+    def __init__(self, maxsize=LOG_QUEUE_MAXSIZE, batch_size=LOG_BATCH_SIZE,
+                 flush_interval=LOG_FLUSH_INTERVAL, spool_dir=LOG_SPOOL_DIR):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_dir = spool_dir
+        self._spool = None
+        self._broker_down_until = 0.0
+        self._retry_delay = 0.5
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._connection = None
+        self._channel = None
+        self._pending = []
+        self.published = 0
+        self.dropped = 0
+        self.reconnects = 0
+        self._dropped_reported = 0
+        self._drop_reported_at = 0.0
+
+    def publish(self, body: bytes) -> bool:
+        """Neblokirajoče doda sporočilo v vrsto. Vrne False, če je vrsta polna."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(body)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _ensure_started(self):
+        # Nit po fork-u (npr. uvicorn workerji) ne preživi, zato jo zaženemo v vsakem procesu posebej
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._connection = None
+            self._channel = None
+            if self.spool_dir and self._spool is None:
+                try:
+                    self._spool = LogSpool(
+                        self.spool_dir,
+                        segment_bytes=LOG_SPOOL_SEGMENT_BYTES,
+                        max_bytes=LOG_SPOOL_MAX_BYTES,
+                        drop_policy=LOG_SPOOL_DROP_POLICY
+                    )
+                except OSError as e:
+                    print(f"Log spool disabled: {e}")
+            self._thread = threading.Thread(target=self._run, name="log-publisher", daemon=True)
+            self._thread.start()
 
-        # Ustvari exchange in queue, če še ne obstajata
-        channel.exchange_declare(exchange=EXCHANGE_NAME, exchange_type='direct', durable=True)
-        channel.queue_declare(queue=QUEUE_NAME, durable=True)
-        channel.queue_bind(exchange=EXCHANGE_NAME, queue=QUEUE_NAME)
+    def _connect(self):
+        self._connection = get_rabbitmq_connection()
+        self._channel = self._connection.channel()
+        self._channel.tx_select()
 
-        timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S,%f")[:-3]
+    def _disconnect(self):
+        try:
+            if self._connection is not None and self._connection.is_open:
+                self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+        self._channel = None
 
-        log_message = f"{timestamp} {log_type} {url} Correlation: {correlation_id} [{service}] - {message}"
+    def _collect_batch(self):
+        """Počaka na prvo sporočilo, nato pobere še vse, kar je že v vrsti (do batch_size)."""
+        stop = False
+        if not self._pending:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                return stop
+            if item is _STOP:
+                return True
+            self._pending.append(item)
+        while len(self._pending) < self.batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stop = True
+                break
+            self._pending.append(item)
+        return stop
 
-        channel.basic_publish(
+    def _publish(self, body):
+        self._channel.basic_publish(
             exchange=EXCHANGE_NAME,
             routing_key=QUEUE_NAME,
-            body=log_message.encode('utf-8')
+            body=body,
+            properties=pika.BasicProperties(delivery_mode=2, content_type='application/json')
         )
 
-        connection.close()
+    def _publish_batch(self, bodies):
+        for body in bodies:
+            self._publish(body)
+        # En povratni klic za cel paket; do commita broker sporočil ne usmeri
+        self._channel.tx_commit()
+
+    def _publish_pending(self):
+        while self._pending:
+            batch = self._pending[:self.batch_size]
+            self._publish_batch(batch)
+            # Iz čakalne vrste odstranimo šele po potrditvi brokerja
+            del self._pending[:len(batch)]
+            self.published += len(batch)
+
+    def _replay_spool(self):
+        """Pošlje najstarejši segment iz spoola; kliče se le, ko je broker dosegljiv."""
+        segment = self._spool.oldest_segment()
+        if segment is None:
+            return
+        path, records = segment
+        for start in range(0, len(records), self.batch_size):
+            batch = records[start:start + self.batch_size]
+            self._publish_batch(batch)
+            # Ob napaki naslednji poskus nadaljuje za zadnjim poslanim paketom
+            self._spool.mark_replayed(path, len(batch))
+            self.published += len(batch)
+        self._spool.remove_segment(path)
+
+    def _spool_pending(self):
+        if self._spool is None:
+            # Brez spoola obdržimo le toliko, kolikor je v paketu; ostalo zavržemo
+            if len(self._pending) > self.batch_size:
+                self.dropped += len(self._pending) - self.batch_size
+                del self._pending[self.batch_size:]
+            return
+        try:
+            self._spool.append(self._pending)
+        except OSError as e:
+            print(f"Failed to spool logs: {e}")
+            self.dropped += len(self._pending)
+        self._pending = []
+
+    def _broker_unavailable(self):
+        self._disconnect()
+        self.reconnects += 1
+        self._broker_down_until = time.monotonic() + self._retry_delay
+        self._retry_delay = min(self._retry_delay * 2, LOG_RECONNECT_MAX_DELAY)
+
+    def _report_dropped(self):
+        now = time.monotonic()
+        if self.dropped == self._dropped_reported or now - self._drop_reported_at < LOG_DROP_REPORT_INTERVAL:
+            return
+        print(f"Failed to send log: dropped {self.dropped - self._dropped_reported} logs "
+              f"(log queue full or broker unavailable), {self.dropped} in total")
+        self._dropped_reported = self.dropped
+        self._drop_reported_at = now
+
+    def _run(self):
+        stop = False
+        while True:
+            self._report_dropped()
+            if not stop:
+                stop = self._collect_batch()
+
+            if time.monotonic() < self._broker_down_until:
+                # Broker je nedosegljiv: ne povezujemo se za vsako sporočilo, loge pišemo na disk
+                self._spool_pending()
+                if stop:
+                    break
+                if self._pending:
+                    # Brez spoola paket ostane v čakanju in _collect_batch ne čaka; ne vrtimo se v prazno
+                    time.sleep(min(self.flush_interval, max(self._broker_down_until - time.monotonic(), 0)))
+                continue
+
+            spooled = self._spool is not None and self._spool.has_data()
+            if not self._pending and not spooled:
+                if stop:
+                    break
+                # Vzdržuj heartbeat, ko ni prometa
+                if self._connection is not None:
+                    try:
+                        self._connection.process_data_events(0)
+                    except Exception:
+                        self._disconnect()
+                continue
+            try:
+                if self._channel is None:
+                    self._connect()
+                if spooled:
+                    self._replay_spool()
+                self._publish_pending()
+                self._retry_delay = 0.5
+            except Exception as e:
+                print(f"Failed to send log: {e}")
+                self._broker_unavailable()
+                self._spool_pending()
+                if stop:
+                    break
+        self._disconnect()
+        if self._spool is not None:
+            self._spool.close()
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "pending": len(self._pending),
+            "published": self.published,
+            "dropped": self.dropped + (self._spool.dropped if self._spool else 0),
+            "reconnects": self.reconnects,
+            "broker_available": time.monotonic() >= self._broker_down_until,
+            "spool": self._spool.stats() if self._spool else None,
+        }
+
+    def flush(self, timeout=LOG_SHUTDOWN_TIMEOUT):
+        """Počaka, da se vrsta izprazni, in ustavi nit (ob zaustavitvi procesa)."""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid() or not thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+        self._thread = None
+
+
+publisher = LogPublisher()
+atexit.register(publisher.flush)
+sampler = LogSampler.from_env()
+
+
+def build_log_envelope(log_type: str, url: str, message: str, service: str, correlation_id: str,
+                       suppressed: int = 0) -> bytes:
+    """Strukturiran (verzioniran) zapis loga, ki ga logging_service razčleni brez regexa"""
+    envelope = {
+        "v": LOG_ENVELOPE_VERSION,
+        "ts": time.time_ns() // 1_000_000,
+        "level": log_type,
+        "url": url,
+        "correlation_id": correlation_id,
+        "app_name": service,
+        "message": message
+    }
+    if suppressed:
+        # Število podobnih logov (isti nivo in route), ki jih je vzorčenje zavrglo pred tem
+        envelope["suppressed"] = suppressed
+    return json.dumps(envelope, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def send_log(log_type: str, url: str, message: str, service: str, correlation_id: str):
+    """Pošlji log v RabbitMQ (asinhrono, preko publisherja v ozadju), če ga vzorčenje ohrani"""
+    try:
+        suppressed = sampler.decide(log_type, url, correlation_id)
+        if suppressed is None:
+            return
+        # Ko je vrsta polna, publisher log zavrže in število zavrženih občasno izpiše sam
+        publisher.publish(build_log_envelope(log_type, url, message, service, correlation_id, suppressed))
     except Exception as e:
         print(f"Failed to send log: {e}")
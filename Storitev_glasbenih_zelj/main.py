@@ -8,8 +8,11 @@ import jwt
 from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
 import os
 from models import MusicRequest, Vote, CreateMusicRequest
-from database import requests_collection
-from logger import send_log
+from database import client, MONGO_DB, requests_collection
+from indexes import INDEXES
+from mongo_indexes import MONGO_ENSURE_INDEXES, ensure_indexes
+from logger import send_log, publisher
+from statistika_client import StatistikaMiddleware, statistika_buffer
 import uuid
 
 app = FastAPI(title="Music Requests Service")
@@ -35,6 +38,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Statistika klicev po predlogi route in metodi (npr. "POST /music/requests")
+app.add_middleware(StatistikaMiddleware)
+
+@app.on_event("startup")
+def ustvari_indekse():
+    if MONGO_ENSURE_INDEXES:
+        try:
+            ensure_indexes(client[MONGO_DB], INDEXES)
+        except Exception as e:
+            print(f"Napaka pri ustvarjanju indeksov: {e}")
+
+@app.on_event("shutdown")
+def flush_logs():
+    publisher.flush()
+
+@app.on_event("shutdown")
+async def flush_statistika():
+    await statistika_buffer.stop()
+
 FOOD_SERVICE_URL = "http://host.docker.internal:8001"
 USER_SERVICE_URL = "http://host.docker.internal:8002"
 
@@ -0,0 +1,138 @@
+"""
+Deklarativni indeksi MongoDB in preverjanje vročih poizvedb.
+
+Storitev v indexes.py deklarira INDEXES ({kolekcija: [IndexModel, ...]}) in HOT_QUERIES
+(poizvedbe, ki tečejo ob vsakem zahtevku). ensure_indexes je idempotenten: ustvari le
+manjkajoče indekse po imenu, obstoječih z drugačno definicijo pa ne spreminja, le javi.
+Med gradnjo izpisuje napredek iz currentOp.
+
+    python indexes.py             # ustvari manjkajoče indekse
+    python indexes.py --explain   # javi vroče poizvedbe, ki še berejo celo kolekcijo (COLLSCAN)
+"""
+import argparse
+import os
+import threading
+import time
+
+from pymongo.errors import OperationFailure
+
+MONGO_ENSURE_INDEXES = os.getenv('MONGO_ENSURE_INDEXES', 'true').lower() == 'true'
+PROGRESS_INTERVAL_SECONDS = 2.0
+
+# Možnosti, ki določajo indeks; ostale (npr. background) ne vplivajo na ujemanje
+_DEFINING_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+
+class HotQuery:
+    def __init__(self, name, collection, filter, sort=None, limit=0):
+        self.name = name
+        self.collection = collection
+        self.filter = filter
+        self.sort = sort
+        self.limit = limit
+
+
+def _definition(document):
+    """(ključ, možnosti) iz IndexModel.document ali zapisa index_information() za primerjavo."""
+    key = document["key"]
+    key = [(field, int(direction)) if isinstance(direction, (int, float)) else (field, direction)
+           for field, direction in (key.items() if isinstance(key, dict) else key)]
+    options = {option: document[option] for option in _DEFINING_OPTIONS if option in document}
+    return key, options
+
+
+def _report_progress(db, collection, name, done):
+    """V ozadju izpisuje napredek gradnje indeksa `name` do nastavitve `done`."""
+    while not done.wait(PROGRESS_INTERVAL_SECONDS):
+        try:
+            ops = db.client.admin.command({"currentOp": 1, "command.createIndexes": collection})["inprog"]
+        except OperationFailure:
+            return
+        for op in ops:
+            progress = op.get("progress")
+            if progress and progress.get("total"):
+                print(f"  {collection}.{name}: {progress['done']}/{progress['total']} "
+                      f"({100 * progress['done'] / progress['total']:.0f} %)")
+
+
+def ensure_indexes(db, indexes):
+    """Ustvari manjkajoče indekse. Vrne (ustvarjeni, neujemajoči) kot seznama imen."""
+    created = []
+    conflicts = []
+    for collection_name, models in indexes.items():
+        collection = db[collection_name]
+        existing = collection.index_information()
+        for model in models:
+            document = model.document
+            name = document["name"]
+            if name in existing:
+                if _definition(existing[name]) != _definition(document):
+                    conflicts.append(f"{collection_name}.{name}")
+                    print(f"Indeks {collection_name}.{name} obstaja z drugačno definicijo; "
+                          f"odstranite ga ročno, da se ustvari na novo.")
+                continue
+
+            print(f"Gradim indeks {collection_name}.{name} ...")
+            started = time.monotonic()
+            done = threading.Event()
+            reporter = threading.Thread(target=_report_progress, args=(db, collection_name, name, done), daemon=True)
+            reporter.start()
+            try:
+                collection.create_indexes([model])
+                created.append(f"{collection_name}.{name}")
+                print(f"Indeks {collection_name}.{name} ustvarjen v {time.monotonic() - started:.1f}s")
+            except OperationFailure as e:
+                # Npr. podvojeni ključi pri unikatnem indeksu; storitev deluje naprej brez njega
+                conflicts.append(f"{collection_name}.{name}")
+                print(f"Indeksa {collection_name}.{name} ni bilo mogoče ustvariti: {e}")
+            finally:
+                done.set()
+                reporter.join()
+    return created, conflicts
+
+
+def _stages(plan):
+    # Pri $or ima stopnja OR več vej (inputStages), vsaka s svojim podplanom
+    yield plan.get("stage")
+    children = list(plan.get("inputStages", []))
+    if plan.get("inputStage"):
+        children.append(plan["inputStage"])
+    for child in children:
+        yield from _stages(child)
+
+
+def explain_hot_queries(db, hot_queries):
+    """Izpiše plan vsake vroče poizvedbe. Vrne imena poizvedb, ki uporabijo COLLSCAN."""
+    collscans = []
+    for query in hot_queries:
+        cursor = db[query.collection].find(query.filter)
+        if query.sort:
+            cursor = cursor.sort(query.sort)
+        if query.limit:
+            cursor = cursor.limit(query.limit)
+        plan = cursor.explain()["queryPlanner"]["winningPlan"]
+        # Novejši MongoDB (SBE) plan zavije v queryPlan
+        stages = set(_stages(plan.get("queryPlan", plan)))
+        if "COLLSCAN" in stages:
+            collscans.append(query.name)
+            print(f"COLLSCAN  {query.name}: {query.collection}.find({query.filter})")
+        else:
+            print(f"ok        {query.name}: {', '.join(sorted(stage for stage in stages if stage))}")
+    return collscans
+
+
+def main(db, indexes, hot_queries):
+    parser = argparse.ArgumentParser(description="Indeksi MongoDB storitve")
+    parser.add_argument("--explain", action="store_true", help="preveri plane vročih poizvedb (COLLSCAN)")
+    args = parser.parse_args()
+
+    if args.explain:
+        collscans = explain_hot_queries(db, hot_queries)
+        if collscans:
+            raise SystemExit(f"{len(collscans)} vročih poizvedb bere celo kolekcijo: {', '.join(collscans)}")
+        return
+
+    created, conflicts = ensure_indexes(db, indexes)
+    print(f"Ustvarjenih indeksov: {len(created)}, neujemajočih: {len(conflicts)}")
+    if conflicts:
+        raise SystemExit(1)
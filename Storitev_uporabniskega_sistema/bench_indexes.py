@@ -0,0 +1,64 @@
+"""
+Prijava (iskanje uporabnika po uporabniškem imenu ali emailu) pri 100k+ uporabnikih,
+brez indeksov in z indeksi iz indexes.py. Uporabi ločeno bazo (privzeto uporabniski_sistem_bench),
+ki jo na začetku izprazni.
+
+    python bench_indexes.py --url mongodb://localhost:27017 -n 100000 -q 500
+"""
+import argparse
+import random
+import statistics
+import time
+
+from pymongo import MongoClient
+
+from indexes import INDEXES
+from mongo_indexes import ensure_indexes
+
+
+def seed(db, count):
+    db.drop_collection("uporabniki")
+    batch = []
+    for i in range(count):
+        batch.append({"uporabnisko_ime": f"uporabnik{i}", "email": f"uporabnik{i}@example.com",
+                      "zakodirano_geslo": "x", "tip_uporabnika": "normal"})
+        if len(batch) == 10000:
+            db.uporabniki.insert_many(batch)
+            batch = []
+    if batch:
+        db.uporabniki.insert_many(batch)
+
+
+def measure(db, count, queries, label):
+    latencies = []
+    for _ in range(queries):
+        login = random.choice([f"uporabnik{random.randrange(count)}", f"uporabnik{random.randrange(count)}@example.com"])
+        start = time.perf_counter()
+        db.uporabniki.find_one({"$or": [{"uporabnisko_ime": login}, {"email": login}]})
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(f"  {label:<12} {queries / sum(latencies):9.1f} prijav/s, "
+          f"p50 {latencies[len(latencies) // 2] * 1000:8.2f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:8.2f} ms, "
+          f"povprečje {statistics.fmean(latencies) * 1000:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="mongodb://localhost:27017")
+    parser.add_argument("--db", default="uporabniski_sistem_bench")
+    parser.add_argument("-n", "--documents", type=int, default=100000)
+    parser.add_argument("-q", "--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    db = MongoClient(args.url)[args.db]
+    print(f"Polnim {args.documents} uporabnikov ...")
+    seed(db, args.documents)
+    print(f"Prijava pri {args.documents} uporabnikih:")
+    measure(db, args.documents, args.queries, "brez indeksov")
+    ensure_indexes(db, {"uporabniki": INDEXES["uporabniki"]})
+    measure(db, args.documents, args.queries, "z indeksi")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Obremenitveni test za GET /uporabnik/prijavljen (p50/p99 latenca in zahtevki/s).
+
+Zahteva httpx (pip install httpx) in zagnano storitev.
+
+    python bench_prijavljen.py load --url http://localhost:8002 -c 50 -n 5000
+
+Počasen broker: storitev usmerimo skozi proxy, ki vsakemu paketu doda zamik,
+npr. RABBITMQ_HOST=<ta gostitelj> RABBITMQ_PORT=5673 in
+
+    python bench_prijavljen.py proxy --listen 5673 --target rabbitmq:5672 --delay 0.5
+
+ter ponovimo `load` in primerjamo p99 z zdravim brokerjem.
+
+Storitev v glavi Server-Timing (jwt) vrne število in čas preverjanj JWT v zahtevku;
+`load` izpiše povprečje, da lahko primerjamo različice storitve.
+
+Val prijav: `storm` ves čas --duration sekund pošilja prijave s -c hkratnimi odjemalci,
+en odjemalec pa meri latenco nepovezanega endpointa (--probe). Izpiše prijave/s,
+zavrnjene (503) in p50/p99 endpointa med valom:
+
+    python bench_prijavljen.py storm -c 200 --duration 20
+
+Primerjamo npr. različne PASSWORD_WORKERS in PASSWORD_QUEUE_SIZE.
+
+Skaliranje s hkratnostjo: `scale` ponovi `load` za vsako stopnjo -c in izpiše
+zahtevke/s ter p99 v tabeli. S sinhronim gonilnikom MongoDB (pymongo) se zahtevki/s
+nad ~10 odjemalci ne povečujejo več, ker klici baze blokirajo event loop; z asinhronim
+(motor) naj rastejo, dokler ne zmanjka povezav v bazenu (MONGO_MAX_POOL_SIZE):
+
+    python bench_prijavljen.py scale -c 1 10 100 -n 2000 --label motor
+
+Predpomnilnik preklicev: storitev zaženemo z REVOCATION_CACHE=false (vsak zahtevek
+sprašuje bazo po črni listi) in z REVOCATION_CACHE=true ter primerjamo izpisa, npr.
+
+    python bench_prijavljen.py load --label "brez predpomnilnika"
+    python bench_prijavljen.py load --label "s predpomnilnikom"
+"""
+import argparse
+import asyncio
+import re
+import statistics
+import time
+
+import httpx
+
+SERVER_TIMING_JWT = re.compile(r'jwt;dur=([\d.]+);desc="(\d+)')
+
+
+async def login(client, username, password):
+    response = await client.post("/uporabnik/prijava", json={
+        "uporabnisko_ime_ali_email": username,
+        "geslo": password
+    })
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def measure(client, headers, concurrency, requests):
+    """(urejene latence, [(jwt ms, preverjanj)], napake, trajanje) za `requests` zahtevkov."""
+    latencies = []
+    jwt_timings = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            response = await client.get("/uporabnik/prijavljen", headers=headers)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+            match = SERVER_TIMING_JWT.search(response.headers.get("server-timing", ""))
+            if match:
+                jwt_timings.append((float(match.group(1)), int(match.group(2))))
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return latencies, jwt_timings, errors, elapsed
+
+
+async def run_load(args):
+    async with httpx.AsyncClient(base_url=args.url, timeout=30) as client:
+        token = await login(client, args.username, args.password)
+        headers = {"Authorization": f"Bearer {token}"}
+        latencies, jwt_timings, errors, elapsed = await measure(client, headers, args.concurrency, args.requests)
+
+    print(f"{args.label}: {len(latencies)} zahtevkov, {args.concurrency} hkrati, {errors} napak")
+    print(f"  {len(latencies) / elapsed:.1f} zahtevkov/s")
+    print(f"  p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms, "
+          f"povprečje {statistics.fmean(latencies) * 1000:.1f} ms")
+    if jwt_timings:
+        print(f"  JWT: {statistics.fmean(count for _, count in jwt_timings):.2f} preverjanj/zahtevek, "
+              f"{statistics.fmean(dur for dur, _ in jwt_timings):.3f} ms/zahtevek")
+
+
+async def run_scale(args):
+    limits = httpx.Limits(max_connections=max(args.concurrency))
+    async with httpx.AsyncClient(base_url=args.url, timeout=60, limits=limits) as client:
+        token = await login(client, args.username, args.password)
+        headers = {"Authorization": f"Bearer {token}"}
+        # Ogrevanje: povezave in predpomnilniki storitve
+        await measure(client, headers, min(args.concurrency), 50)
+        rows = []
+        for concurrency in args.concurrency:
+            latencies, _, errors, elapsed = await measure(client, headers, concurrency, args.requests)
+            rows.append((concurrency, len(latencies) / elapsed,
+                         latencies[len(latencies) // 2],
+                         latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)], errors))
+
+    print(f"{args.label}: {args.requests} zahtevkov na stopnjo")
+    print(f"  {'hkrati':>7} {'zahtevkov/s':>12} {'p50 ms':>8} {'p99 ms':>8} {'napake':>7}")
+    for concurrency, throughput, p50, p99, errors in rows:
+        print(f"  {concurrency:>7} {throughput:>12.1f} {p50 * 1000:>8.1f} {p99 * 1000:>8.1f} {errors:>7}")
+
+
+async def run_storm(args):
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(base_url=args.url, timeout=60, limits=limits) as client:
+        token = await login(client, args.username, args.password)
+        headers = {"Authorization": f"Bearer {token}"}
+        statuses = {}
+        probe_latencies = []
+        deadline = time.perf_counter() + args.duration
+
+        async def login_worker():
+            while time.perf_counter() < deadline:
+                response = await client.post("/uporabnik/prijava", json={
+                    "uporabnisko_ime_ali_email": args.username,
+                    "geslo": args.password
+                })
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def probe_worker():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                await client.get(args.probe, headers=headers)
+                probe_latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(probe_worker(), *[login_worker() for _ in range(args.concurrency)])
+        elapsed = time.perf_counter() - started
+
+    probe_latencies.sort()
+    print(f"{args.label}: {args.concurrency} hkratnih prijav, {elapsed:.1f}s")
+    print(f"  {statuses.get(200, 0) / elapsed:.1f} uspešnih prijav/s, odgovori {dict(sorted(statuses.items()))}")
+    print(f"  {args.probe} med valom: p50 {probe_latencies[len(probe_latencies) // 2] * 1000:.1f} ms, "
+          f"p99 {probe_latencies[min(int(len(probe_latencies) * 0.99), len(probe_latencies) - 1)] * 1000:.1f} ms "
+          f"({len(probe_latencies)} zahtevkov)")
+
+
+async def run_proxy(args):
+    target_host, target_port = args.target.rsplit(":", 1)
+
+    async def pipe(reader, writer):
+        try:
+            while data := await reader.read(65536):
+                await asyncio.sleep(args.delay)
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle(client_reader, client_writer):
+        broker_reader, broker_writer = await asyncio.open_connection(target_host, int(target_port))
+        await asyncio.gather(pipe(client_reader, broker_writer), pipe(broker_reader, client_writer))
+
+    server = await asyncio.start_server(handle, "0.0.0.0", args.listen)
+    print(f"Proxy :{args.listen} -> {args.target} z zamikom {args.delay}s")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    load_parser = subparsers.add_parser("load")
+    load_parser.add_argument("--url", default="http://localhost:8002")
+    load_parser.add_argument("--username", default="admin")
+    load_parser.add_argument("--password", default="admin")
+    load_parser.add_argument("-c", "--concurrency", type=int, default=50)
+    load_parser.add_argument("-n", "--requests", type=int, default=2000)
+    load_parser.add_argument("--label", default="prijavljen")
+
+    scale_parser = subparsers.add_parser("scale")
+    scale_parser.add_argument("--url", default="http://localhost:8002")
+    scale_parser.add_argument("--username", default="admin")
+    scale_parser.add_argument("--password", default="admin")
+    scale_parser.add_argument("-c", "--concurrency", type=int, nargs="+", default=[1, 10, 100])
+    scale_parser.add_argument("-n", "--requests", type=int, default=2000)
+    scale_parser.add_argument("--label", default="skaliranje")
+
+    storm_parser = subparsers.add_parser("storm")
+    storm_parser.add_argument("--url", default="http://localhost:8002")
+    storm_parser.add_argument("--username", default="admin")
+    storm_parser.add_argument("--password", default="admin")
+    storm_parser.add_argument("-c", "--concurrency", type=int, default=200)
+    storm_parser.add_argument("--duration", type=float, default=20)
+    storm_parser.add_argument("--probe", default="/uporabnik/prijavljen")
+    storm_parser.add_argument("--label", default="val prijav")
+
+    proxy_parser = subparsers.add_parser("proxy")
+    proxy_parser.add_argument("--listen", type=int, default=5673)
+    proxy_parser.add_argument("--target", default="rabbitmq:5672")
+    proxy_parser.add_argument("--delay", type=float, default=0.5)
+
+    args = parser.parse_args()
+    commands = {"load": run_load, "scale": run_scale, "storm": run_storm, "proxy": run_proxy}
+    asyncio.run(commands[args.command](args))
+
+
+if __name__ == "__main__":
+    main()
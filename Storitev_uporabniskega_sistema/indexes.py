@@ -0,0 +1,45 @@
+"""
+Indeksi MongoDB uporabniškega sistema. Storitev jih ustvari ob zagonu (MONGO_ENSURE_INDEXES),
+ročno pa:
+
+    python indexes.py [--explain]
+"""
+import os
+
+from pymongo import ASCENDING, IndexModel, MongoClient
+
+from mongo_indexes import HotQuery, main
+
+INDEXES = {
+    "uporabniki": [
+        IndexModel([("uporabnisko_ime", ASCENDING)], name="uporabnisko_ime_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "seje": [
+        IndexModel([("session_token", ASCENDING)], name="session_token_unique", unique=True,
+                   partialFilterExpression={"type": "session"}),
+        IndexModel([("token_id", ASCENDING), ("type", ASCENDING)], name="token_id_type"),
+        IndexModel([("user_id", ASCENDING), ("type", ASCENDING)], name="user_id_type"),
+        # Osveževanje predpomnilnika preklicev (revocation_cache)
+        IndexModel([("type", ASCENDING), ("added_at", ASCENDING)], name="type_added_at"),
+        # Seje, refresh tokeni in preklici se odstranijo, ko potečejo
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "veselice": [
+        IndexModel([("prijavljeni_uporabniki", ASCENDING)], name="prijavljeni_uporabniki"),
+    ],
+}
+
+HOT_QUERIES = [
+    HotQuery("prijava", "uporabniki", {"$or": [{"uporabnisko_ime": "admin"}, {"email": "admin"}]}),
+    HotQuery("seja", "seje", {"session_token": "x", "type": "session"}),
+    HotQuery("crna lista", "seje", {"token_id": "x", "type": "blacklist"}),
+    HotQuery("refresh token", "seje", {"token_id": "x", "user_id": "x", "type": "refresh_token"}),
+    HotQuery("preklici od", "seje", {"type": "blacklist", "added_at": {"$gt": 0}}),
+    HotQuery("veselica uporabnika", "veselice", {"prijavljeni_uporabniki": {"$in": ["x"]}}),
+]
+
+
+if __name__ == "__main__":
+    client = MongoClient(os.getenv('MONGODB_URL', 'mongodb://localhost:27017/uporabniski_sistem'))
+    main(client["uporabniski_sistem"], INDEXES, HOT_QUERIES)
@@ -0,0 +1,210 @@
+import asyncio
+import time
+
+import aio_pika
+
+
+class AsyncLogSink:
+    """
+    Asinhron izhod za loge: log_request sporočilo le doda v omejeno asyncio vrsto,
+    opravilo v ozadju pa ga preko ene trajne AMQP povezave pošlje v RabbitMQ.
+    Sporočila se pošiljajo v paketih, potrditve (publisher confirms) čakamo hkrati.
+
+    Ko broker ni dosegljiv, se do naslednjega poskusa (z naraščajočim zamikom) ne
+    povezujemo, loge pa zapisujemo v `spool` (LogSpool) in jih kasneje ponovno pošljemo.
+    """
+
+    def __init__(self, host, port, user, password, exchange_name, queue_name,
+                 maxsize=10000, batch_size=200, reconnect_max_delay=30.0, spool=None,
+                 drop_report_interval=10.0):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.exchange_name = exchange_name
+        self.queue_name = queue_name
+        self.batch_size = batch_size
+        self.reconnect_max_delay = reconnect_max_delay
+        self.drop_report_interval = drop_report_interval
+        self.spool = spool
+
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self._pending = []
+        self._task = None
+        self._connection = None
+        self._exchange = None
+        self._closing = False
+        self._broker_down_until = 0.0
+        self._retry_delay = 0.5
+
+        self.published = 0
+        self.dropped = 0
+        self.failures = 0
+        self._dropped_reported = 0
+        self._drop_reported_at = 0.0
+
+    def emit(self, body: bytes) -> bool:
+        """
+        Neblokirajoče doda log v vrsto. Ko je vrsta polna (broker ne dohaja),
+        se log zavrže, da zahtevki ne čakajo na RabbitMQ.
+        """
+        try:
+            self._queue.put_nowait(body)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._task = asyncio.create_task(self._run(), name="log-sink")
+
+    async def stop(self, timeout=5.0):
+        """Poskusi poslati še preostale loge in zapre povezavo."""
+        self._closing = True
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+            self._task = None
+        if self._connection is not None:
+            try:
+                await self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize() + len(self._pending),
+            "published": self.published,
+            "dropped": self.dropped,
+            "failures": self.failures,
+            "broker_available": time.monotonic() >= self._broker_down_until,
+            "spool": self.spool.stats() if self.spool is not None else None,
+        }
+
+    async def _connect(self):
+        connection = await aio_pika.connect_robust(
+            host=self.host,
+            port=self.port,
+            login=self.user,
+            password=self.password,
+        )
+        try:
+            channel = await connection.channel(publisher_confirms=True)
+            exchange = await channel.declare_exchange(
+                self.exchange_name, aio_pika.ExchangeType.DIRECT, durable=True)
+            queue = await channel.declare_queue(self.queue_name, durable=True)
+            await queue.bind(exchange, routing_key=self.queue_name)
+        except Exception:
+            await connection.close()
+            raise
+        # Robustna povezava se po izpadu sama obnovi, zato jo ustvarimo le enkrat
+        self._connection = connection
+        self._exchange = exchange
+
+    async def _collect_batch(self):
+        if not self._pending:
+            try:
+                self._pending.append(await asyncio.wait_for(self._queue.get(), timeout=0.5))
+            except asyncio.TimeoutError:
+                return
+        while len(self._pending) < self.batch_size and not self._queue.empty():
+            self._pending.append(self._queue.get_nowait())
+
+    async def _publish(self, bodies):
+        await asyncio.gather(*[
+            self._exchange.publish(
+                aio_pika.Message(
+                    body,
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                    content_type='application/json'
+                ),
+                routing_key=self.queue_name
+            )
+            for body in bodies
+        ])
+
+    async def _publish_pending(self):
+        batch = self._pending[:self.batch_size]
+        await self._publish(batch)
+        # Iz čakalne vrste odstranimo šele, ko broker potrdi cel paket
+        del self._pending[:len(batch)]
+        self.published += len(batch)
+
+    async def _replay_spool(self):
+        segment = await asyncio.to_thread(self.spool.oldest_segment)
+        if segment is None:
+            return
+        path, records = segment
+        for start in range(0, len(records), self.batch_size):
+            batch = records[start:start + self.batch_size]
+            await self._publish(batch)
+            # Ob napaki naslednji poskus nadaljuje za zadnjim poslanim paketom
+            await asyncio.to_thread(self.spool.mark_replayed, path, len(batch))
+            self.published += len(batch)
+        await asyncio.to_thread(self.spool.remove_segment, path)
+
+    async def _spool_pending(self):
+        if self.spool is None:
+            # Brez spoola obdržimo le en paket; ostalo zavržemo
+            if len(self._pending) > self.batch_size:
+                self.dropped += len(self._pending) - self.batch_size
+                del self._pending[self.batch_size:]
+            return
+        batch, self._pending = self._pending, []
+        try:
+            await asyncio.to_thread(self.spool.append, batch)
+        except OSError as e:
+            print(f"Failed to spool logs: {e}")
+            self.dropped += len(batch)
+
+    def _report_dropped(self):
+        # Zavržene loge le preštejemo; izpis največ enkrat na drop_report_interval sekund
+        now = time.monotonic()
+        if self.dropped == self._dropped_reported or now - self._drop_reported_at < self.drop_report_interval:
+            return
+        print(f"Failed to send log: dropped {self.dropped - self._dropped_reported} logs "
+              f"(log queue full or broker unavailable), {self.dropped} in total")
+        self._dropped_reported = self.dropped
+        self._drop_reported_at = now
+
+    async def _run(self):
+        while True:
+            self._report_dropped()
+            if self._closing and not self._pending and self._queue.empty():
+                break
+            await self._collect_batch()
+
+            if time.monotonic() < self._broker_down_until:
+                # Broker je nedosegljiv: ne povezujemo se za vsako sporočilo, loge pišemo na disk
+                await self._spool_pending()
+                if self._pending:
+                    # Brez spoola paket ostane v čakanju in _collect_batch ne čaka; ne vrtimo se v prazno
+                    await asyncio.sleep(min(0.5, max(self._broker_down_until - time.monotonic(), 0)))
+                continue
+
+            spooled = self.spool is not None and self.spool.has_data()
+            if not self._pending and not spooled:
+                continue
+            try:
+                if self._exchange is None:
+                    await self._connect()
+                if spooled:
+                    await self._replay_spool()
+                if self._pending:
+                    await self._publish_pending()
+                self._retry_delay = 0.5
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                print(f"Failed to send log: {e}")
+                self._broker_down_until = time.monotonic() + self._retry_delay
+                self._retry_delay = min(self._retry_delay * 2, self.reconnect_max_delay)
+                await self._spool_pending()
+        if self.spool is not None:
+            self.spool.close()
@@ -0,0 +1,91 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+PASSWORD_POOL_KIND = os.getenv('PASSWORD_POOL_KIND', 'thread')
+PASSWORD_WORKERS = int(os.getenv('PASSWORD_WORKERS', os.cpu_count() or 2))
+# Največ zahtevkov, ki čakajo na prost worker; vsi nadaljnji takoj dobijo 503
+PASSWORD_QUEUE_SIZE = int(os.getenv('PASSWORD_QUEUE_SIZE', PASSWORD_WORKERS * 4))
+
+# Privzete vrednosti so passlibove; spremembe veljajo za nova gesla, obstoječa se
+# ob prijavi ponovno zakodirajo (verify_and_update)
+ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', 102400))
+ARGON2_PARALLELISM = int(os.getenv('ARGON2_PARALLELISM', 8))
+
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__time_cost=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST,
+    argon2__parallelism=ARGON2_PARALLELISM,
+)
+
+
+class PasswordPoolSaturated(Exception):
+    pass
+
+
+def hash_password(geslo):
+    return pwd_context.hash(geslo)
+
+
+def verify_and_update(geslo, zakodirano_geslo):
+    """(ujemanje, nova zgoščena vrednost ali None, če parametri niso zastareli)"""
+    return pwd_context.verify_and_update(geslo, zakodirano_geslo)
+
+
+class PasswordPool:
+    """
+    Argon2 (hash, verify) izvaja v omejenem bazenu niti ali procesov namesto na niti
+    event loopa. argon2-cffi med izračunom sprosti GIL, zato niti (privzeto) zadoščajo;
+    PASSWORD_POOL_KIND=process je za okolja, kjer to ne drži.
+
+    Hkrati je v obdelavi ali čakanju največ workers + queue_size klicev; ko je bazen
+    poln, klic takoj sproži PasswordPoolSaturated.
+    """
+
+    def __init__(self, kind=PASSWORD_POOL_KIND, workers=PASSWORD_WORKERS, queue_size=PASSWORD_QUEUE_SIZE):
+        self.kind = kind
+        self.workers = workers
+        self.limit = workers + queue_size
+        self._executor = None
+        self._pending = 0
+
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="argon2")
+        return self._executor
+
+    async def _run(self, function, *args):
+        if self._pending >= self.limit:
+            self.rejected += 1
+            raise PasswordPoolSaturated()
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), function, *args)
+        finally:
+            self._pending -= 1
+            self.completed += 1
+
+    async def hash(self, geslo):
+        return await self._run(hash_password, geslo)
+
+    async def verify_and_update(self, geslo, zakodirano_geslo):
+        return await self._run(verify_and_update, geslo, zakodirano_geslo)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_pool = PasswordPool()
@@ -0,0 +1,117 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+REVOCATION_CACHE_ENABLED = os.getenv('REVOCATION_CACHE', 'true').lower() == 'true'
+REVOCATION_POLL_SECONDS = float(os.getenv('REVOCATION_POLL_SECONDS', 5))
+# Zapise drugih instanc označi njihova ura; novejše preklice zato iščemo z nekaj prekrivanja
+REVOCATION_CLOCK_SKEW_SECONDS = float(os.getenv('REVOCATION_CLOCK_SKEW_SECONDS', 30))
+# Če osveževanje toliko časa ne uspe, predpomnilniku ne zaupamo več in sprašujemo bazo
+REVOCATION_MAX_STALENESS_SECONDS = float(os.getenv('REVOCATION_MAX_STALENESS_SECONDS', 60))
+
+_PROJECTION = {"token_id": 1, "expires_at": 1, "added_at": 1, "_id": 0}
+
+
+class RevocationCache:
+    """
+    Lokalna množica preklicanih JWT (jti) iz kolekcije seje (type "blacklist").
+
+    Ob zagonu naloži vse še veljavne preklice, nato vsakih `poll_seconds` prebere nove
+    (po added_at). Vnos odstranimo, ko token tudi sicer poteče, zato je množica omejena
+    s številom preklicev v času veljavnosti refresh tokena. Preklici te instance so
+    vidni takoj, preklici drugih instanc po največ enem intervalu osveževanja.
+
+    is_revoked vrne None, kadar predpomnilnik ni naložen ali je zastarel; klicatelj
+    tedaj preveri bazo kot doslej.
+    """
+
+    def __init__(self, poll_seconds=REVOCATION_POLL_SECONDS, clock_skew_seconds=REVOCATION_CLOCK_SKEW_SECONDS,
+                 max_staleness_seconds=REVOCATION_MAX_STALENESS_SECONDS):
+        self.poll_seconds = poll_seconds
+        self.clock_skew = timedelta(seconds=clock_skew_seconds)
+        self.max_staleness = timedelta(seconds=max_staleness_seconds)
+        self._revoked = {}
+        self._collection = None
+        self._last_added_at = None
+        self._refreshed_at = None
+        self._task = None
+
+    async def load(self, collection):
+        """Naloži vse še veljavne preklice iz `collection` (asinhrona kolekcija, motor)."""
+        now = datetime.utcnow()
+        revoked = {}
+        last_added_at = now
+        async for doc in collection.find({"type": "blacklist", "expires_at": {"$gt": now}}, _PROJECTION):
+            if doc.get("token_id"):
+                revoked[doc["token_id"]] = doc.get("expires_at")
+            if doc.get("added_at") and doc["added_at"] > last_added_at:
+                last_added_at = doc["added_at"]
+        self._collection = collection
+        self._revoked = revoked
+        self._last_added_at = last_added_at
+        self._refreshed_at = now
+        print(f"Revocation cache loaded: {len(revoked)} revoked tokens")
+
+    async def refresh(self):
+        """Prebere preklice, dodane od zadnjega osveževanja, in odstrani potekle."""
+        now = datetime.utcnow()
+        since = self._last_added_at - self.clock_skew
+        docs = await self._collection.find({"type": "blacklist", "added_at": {"$gt": since}}, _PROJECTION).to_list(None)
+        for doc in docs:
+            if doc.get("token_id"):
+                self._revoked[doc["token_id"]] = doc.get("expires_at")
+            if doc.get("added_at") and doc["added_at"] > self._last_added_at:
+                self._last_added_at = doc["added_at"]
+        expired = [token_id for token_id, expires_at in self._revoked.items() if expires_at and expires_at <= now]
+        for token_id in expired:
+            del self._revoked[token_id]
+        self._refreshed_at = now
+
+    def add(self, token_id, expires_at):
+        """Preklic te instance; viden takoj, brez čakanja na osveževanje."""
+        self._revoked[token_id] = expires_at
+
+    def is_revoked(self, token_id):
+        if self._refreshed_at is None or datetime.utcnow() - self._refreshed_at > self.max_staleness:
+            return None
+        return token_id in self._revoked
+
+    def stats(self):
+        return {
+            "revoked": len(self._revoked),
+            "refreshed_at": self._refreshed_at.isoformat() if self._refreshed_at else None,
+            "stale": self.is_revoked(None) is None,
+        }
+
+    def __len__(self):
+        return len(self._revoked)
+
+    async def start(self, collection):
+        if collection is None:
+            return
+        try:
+            await self.load(collection)
+        except Exception as e:
+            print(f"Revocation cache load failed, checking the database instead: {e}")
+            return
+        self._task = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Revocation cache refresh failed: {e}")
+
+
+revocation_cache = RevocationCache()
@@ -1,24 +1,36 @@
-from fastapi import FastAPI, Request, Depends, HTTPException, status, Cookie, Response
-from statistika_client import poslji_statistiko
+from fastapi import FastAPI, Request, Depends, HTTPException, status, Cookie, Response, Query
+from fastapi.responses import StreamingResponse
+from statistika_client import StatistikaMiddleware, statistika_buffer
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pymongo import MongoClient
-from passlib.context import CryptContext
+from pymongo.errors import DuplicateKeyError
+from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic import BaseModel, EmailStr, field_validator, model_validator
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta
 from bson import ObjectId
 from jwt.exceptions import ExpiredSignatureError, InvalidTokenError, PyJWTError
+import asyncio
 import secrets
 import json
 import os
 import jwt
-import pika
 import uuid
+import time
 import logging
+import tempfile
 from dotenv import load_dotenv
 from pathlib import Path
 from correlation import set_correlation_id, get_correlation_id
+from log_sampling import LogSampler
+from log_sink import AsyncLogSink
+from log_spool import LogSpool
+from revocation_cache import REVOCATION_CACHE_ENABLED, revocation_cache
+from user_cache import user_cache
+from indexes import INDEXES
+from mongo_indexes import MONGO_ENSURE_INDEXES, ensure_indexes
+from password_pool import PasswordPoolSaturated, hash_password, password_pool
 
 
 JWT_SECRET_KEY = os.getenv(
@@ -39,6 +51,15 @@ MONGODB_URL = os.getenv(
 SERVICE_HOST = os.getenv('SERVICE_HOST', '0.0.0.0')
 SERVICE_PORT = int(os.getenv('SERVICE_PORT', 8000))
 
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 100))
+MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', 0))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 60000))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000))
+
+USERS_PAGE_SIZE = int(os.getenv('USERS_PAGE_SIZE', 100))
+USERS_MAX_PAGE_SIZE = int(os.getenv('USERS_MAX_PAGE_SIZE', 1000))
+USERS_EXPORT_BATCH_SIZE = int(os.getenv('USERS_EXPORT_BATCH_SIZE', 1000))
+
 
 # Load repository root .env (one level above this service folder)
 try:
@@ -55,6 +76,15 @@ RABBITMQ_USER = os.getenv('RABBITMQ_USER', 'admin')
 RABBITMQ_PASS = os.getenv('RABBITMQ_PASS', 'secret')
 EXCHANGE_NAME = 'logging_exchange'
 QUEUE_NAME = 'logging_queue'
+LOG_ENVELOPE_VERSION = 1
+LOG_QUEUE_MAXSIZE = int(os.getenv('LOG_QUEUE_MAXSIZE', 10000))
+LOG_BATCH_SIZE = int(os.getenv('LOG_BATCH_SIZE', 200))
+LOG_DROP_REPORT_INTERVAL = float(os.getenv('LOG_DROP_REPORT_INTERVAL', 10))
+# Docker slika nastavi /var/spool/logs na volumnu; v /tmp vsebnika spool ne preživi ponovnega ustvarjenja
+LOG_SPOOL_DIR = os.getenv('LOG_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'log_spool'))
+LOG_SPOOL_SEGMENT_BYTES = int(os.getenv('LOG_SPOOL_SEGMENT_BYTES', 4 * 1024 * 1024))
+LOG_SPOOL_MAX_BYTES = int(os.getenv('LOG_SPOOL_MAX_BYTES', 256 * 1024 * 1024))
+LOG_SPOOL_DROP_POLICY = os.getenv('LOG_SPOOL_DROP_POLICY', 'oldest')
 
 mongo_client = None
 users_collection = None
@@ -62,16 +92,25 @@ veselice_collection = None
 sessions_collection = None
 
 
-def init_database():
+async def init_database():
+    """
+    Poveže se z MongoDB preko asinhronega gonilnika (motor). Velikost poola povezav
+    nastavimo z MONGO_MAX_POOL_SIZE/MONGO_MIN_POOL_SIZE; toliko poizvedb lahko en
+    proces izvaja hkrati, ne da bi blokiral event loop.
+    """
     global mongo_client, users_collection, veselice_collection, sessions_collection
 
     try:
-        mongo_client = MongoClient(
+        mongo_client = AsyncIOMotorClient(
             MONGODB_URL,
             serverSelectionTimeoutMS=5000,
-            connectTimeoutMS=5000
+            connectTimeoutMS=5000,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+            waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS
         )
-        mongo_client.admin.command('ping')
+        await mongo_client.admin.command('ping')
         db = mongo_client["uporabniski_sistem"]
         users_collection = db["uporabniki"]
         veselice_collection = db["veselice"]
@@ -80,6 +119,8 @@ def init_database():
         return True
     except Exception as e:
         print(f"MongoDB connection error: {e}")
+        if mongo_client is not None:
+            mongo_client.close()
         mongo_client = None
         users_collection = None
         veselice_collection = None
@@ -87,46 +128,58 @@ def init_database():
         return False
 
 
-db_initialized = init_database()
-
+log_sink = AsyncLogSink(
+    host=RABBITMQ_HOST,
+    port=RABBITMQ_PORT,
+    user=RABBITMQ_USER,
+    password=RABBITMQ_PASS,
+    exchange_name=EXCHANGE_NAME,
+    queue_name=QUEUE_NAME,
+    maxsize=LOG_QUEUE_MAXSIZE,
+    batch_size=LOG_BATCH_SIZE,
+    drop_report_interval=LOG_DROP_REPORT_INTERVAL,
+    spool=LogSpool(
+        LOG_SPOOL_DIR,
+        segment_bytes=LOG_SPOOL_SEGMENT_BYTES,
+        max_bytes=LOG_SPOOL_MAX_BYTES,
+        drop_policy=LOG_SPOOL_DROP_POLICY
+    )
+)
 
-def get_rabbitmq_connection():
-    credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASS)
-    connection = pika.BlockingConnection(pika.ConnectionParameters(
-        host=RABBITMQ_HOST,
-        port=RABBITMQ_PORT,
-        credentials=credentials
-    ))
-    return connection
+log_sampler = LogSampler.from_env()
 
 
 def send_log(timestamp, level, url, correlation_id, app_name, message):
+    """
+    Doda log (strukturiran JSON zapis, timestamp v epoch milisekundah) v vrsto za RabbitMQ.
+    Ne blokira; pošiljanje opravi log_sink v ozadju. Loge, ki jih vzorčenje zavrže,
+    le preštejemo; število se zapiše v polje "suppressed" naslednjega ohranjenega loga.
+    """
     try:
-        log_message = f"{timestamp} {level} {url} Correlation: {correlation_id} [{app_name}] - {message}"
-        print(f"LOG MESSAGE: {log_message}")
-        connection = get_rabbitmq_connection()
-        print("RabbitMQ connection established")
-        channel = connection.channel()
-        channel.exchange_declare(exchange=EXCHANGE_NAME, exchange_type='direct', durable=True)
-        channel.queue_declare(queue=QUEUE_NAME, durable=True)
-        channel.queue_bind(exchange=EXCHANGE_NAME, queue=QUEUE_NAME, routing_key=QUEUE_NAME)
-        channel.basic_publish(
-            exchange=EXCHANGE_NAME,
-            routing_key=QUEUE_NAME,
-            body=log_message.encode('utf-8') if isinstance(log_message, str) else log_message,
-            properties=pika.BasicProperties(delivery_mode=2)
-        )
-        print("Log published successfully")
-        connection.close()
+        suppressed = log_sampler.decide(level, url, correlation_id)
+        if suppressed is None:
+            return
+        envelope = {
+            "v": LOG_ENVELOPE_VERSION,
+            "ts": timestamp,
+            "level": level,
+            "url": url,
+            "correlation_id": correlation_id,
+            "app_name": app_name,
+            "message": message
+        }
+        if suppressed:
+            envelope["suppressed"] = suppressed
+        log_message = json.dumps(envelope, separators=(',', ':'), ensure_ascii=False)
+        # Ko je vrsta polna, log_sink log zavrže in število zavrženih občasno izpiše sam
+        log_sink.emit(log_message.encode('utf-8'))
     except Exception as e:
         print(f"Failed to send log: {e}")
-        import traceback
-        traceback.print_exc()
 
 
 def log_request(request, message, level='INFO'):
     correlation_id = getattr(request.state, 'correlation_id', 'unknown')
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]
+    timestamp = time.time_ns() // 1_000_000
     url = str(request.url)
     app_name = 'storitev_uporabniskega_sistema'
     send_log(timestamp, level, url, correlation_id, app_name, message)
@@ -188,8 +241,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Statistika klicev po predlogi route in metodi (npr. "GET /veselice/{veselica_id}")
+app.add_middleware(StatistikaMiddleware)
+
 
 @app.middleware("http")
 async def correlation_middleware(request, call_next):
@@ -234,6 +291,10 @@ class OdgovorUporabnika(BaseModel):
     id_veselica: Optional[str] = None
 
 
+# Polja za seznam uporabnikov; zakodirano_geslo se nikoli ne prebere
+UPORABNIK_PROJEKCIJA = {field: 1 for field in OdgovorUporabnika.model_fields if field != "id"}
+
+
 class PrijavaUporabnika(BaseModel):
     uporabnisko_ime_ali_email: str
     geslo: str
@@ -320,9 +381,6 @@ class PrijavaNaVeselico(BaseModel):
     veselica_id: str
 
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
-
-
 def ustvari_jwt_token(data: Dict[str, Any], token_type: str = "access") -> str:
     """
     Ustvari JWT token z vsemi zahtevanimi atributi.
@@ -382,7 +440,7 @@ def ustvari_refresh_token(user_id: str) -> str:
     return ustvari_jwt_token(token_data, token_type="refresh")
 
 
-def preveri_jwt_token(token: str, token_type: str = "access") -> Dict[str, Any]:
+async def preveri_jwt_token(token: str, token_type: str = "access") -> Dict[str, Any]:
     """
     Preveri veljavnost JWT tokena in vrne podatke.
     """
@@ -405,10 +463,13 @@ def preveri_jwt_token(token: str, token_type: str = "access") -> Dict[str, Any]:
         if mongo_client is not None and sessions_collection is not None:
             token_id = payload.get("jti")
             if token_id:
-                revoked_token = sessions_collection.find_one({
-                    "token_id": token_id,
-                    "type": "blacklist"
-                })
+                revoked_token = revocation_cache.is_revoked(token_id)
+                if revoked_token is None:
+                    # Predpomnilnik ni naložen ali je zastarel
+                    revoked_token = await sessions_collection.find_one({
+                        "token_id": token_id,
+                        "type": "blacklist"
+                    })
                 if revoked_token:
                     raise HTTPException(
                         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -437,6 +498,27 @@ def preveri_jwt_token(token: str, token_type: str = "access") -> Dict[str, Any]:
         )
 
 
+async def preveri_jwt_za_zahtevek(request: Request, token: str, token_type: str = "access") -> Dict[str, Any]:
+    """
+    Preveri JWT token največ enkrat na zahtevek: preverjene claime shrani v
+    request.state.jwt_claims, kjer jih najdejo middleware in vse odvisnosti.
+    Število in skupni čas preverjanj se beležita v request.state (glej Server-Timing).
+    """
+    claims = getattr(request.state, "jwt_claims", None)
+    if claims is not None and request.state.jwt_token == token and claims.get("type") == token_type:
+        return claims
+
+    started = time.perf_counter()
+    try:
+        claims = await preveri_jwt_token(token, token_type=token_type)
+    finally:
+        request.state.jwt_verifications = getattr(request.state, "jwt_verifications", 0) + 1
+        request.state.jwt_verify_ms = getattr(request.state, "jwt_verify_ms", 0.0) + (time.perf_counter() - started) * 1000
+    request.state.jwt_token = token
+    request.state.jwt_claims = claims
+    return claims
+
+
 def pridobi_token_iz_zaglavja(credentials: HTTPAuthorizationCredentials) -> Optional[str]:
     """
     Pridobi JWT token iz Authorization zaglavja.
@@ -447,7 +529,36 @@ def pridobi_token_iz_zaglavja(credentials: HTTPAuthorizationCredentials) -> Opti
     return None
 
 
+async def pridobi_uporabnika_po_id(user_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Pridobi uporabnika po id iz predpomnilnika (user_cache) ali baze.
+    """
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    generation = user_cache.generation
+    user = await users_collection.find_one({"_id": ObjectId(user_id)})
+    if user:
+        user["id"] = str(user["_id"])
+        user_cache.put(user_id, user, generation)
+    return user
+
+
+def identiteta_iz_claimov(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Identiteta uporabnika iz preverjenih claimov access tokena (brez branja baze).
+    """
+    return {
+        "id": payload["sub"],
+        "uporabnisko_ime": payload.get("username"),
+        "email": payload.get("email"),
+        "tip_uporabnika": payload.get("user_type", "normal"),
+    }
+
+
 async def get_current_user(
+    request: Request,
     token: HTTPAuthorizationCredentials = Depends(security),
     session_token: str = Cookie(None)
 ) -> Optional[Dict[str, Any]]:
@@ -458,17 +569,15 @@ async def get_current_user(
         jwt_token = pridobi_token_iz_zaglavja(token)
         if jwt_token:
             try:
-                payload = preveri_jwt_token(jwt_token, token_type="access")
+                payload = await preveri_jwt_za_zahtevek(request, jwt_token, token_type="access")
                 user_id = payload.get("sub")
                 if user_id:
                     if mongo_client is None:
                         raise HTTPException(
                             status_code=503, detail="Baza ni na voljo")
 
-                    user = users_collection.find_one(
-                        {"_id": ObjectId(user_id)})
+                    user = await pridobi_uporabnika_po_id(user_id)
                     if user:
-                        user["id"] = str(user["_id"])
                         return user
 
             except HTTPException:
@@ -477,17 +586,35 @@ async def get_current_user(
                 pass
 
     if session_token and mongo_client is not None:
-        session = pridobi_sejo(session_token)
+        session = await pridobi_sejo(session_token)
         if session:
-            user = users_collection.find_one(
-                {"_id": ObjectId(session["user_id"])})
+            user = await pridobi_uporabnika_po_id(session["user_id"])
             if user:
-                user["id"] = str(user["_id"])
                 return user
 
     return None
 
 
+async def get_current_identity(
+    request: Request,
+    token: HTTPAuthorizationCredentials = Depends(security),
+    session_token: str = Cookie(None)
+) -> Optional[Dict[str, Any]]:
+    """
+    Pridobi identiteto trenutnega uporabnika (id, uporabniško ime, email, tip).
+    Pri JWT jo vzame iz claimov brez branja baze, pri seji prebere uporabnika.
+    Claimi so lahko zastareli največ za čas veljavnosti access tokena.
+    """
+    if token:
+        jwt_token = pridobi_token_iz_zaglavja(token)
+        if jwt_token:
+            payload = await preveri_jwt_za_zahtevek(request, jwt_token, token_type="access")
+            if payload.get("sub"):
+                return identiteta_iz_claimov(payload)
+
+    return await get_current_user(request, token=None, session_token=session_token)
+
+
 def zahtevaj_avtentikacijo(current_user: Dict[str, Any] = Depends(get_current_user)):
     """
     Zahteva avtentikacijo uporabnika.
@@ -501,9 +628,22 @@ def zahtevaj_avtentikacijo(current_user: Dict[str, Any] = Depends(get_current_us
     return current_user
 
 
-def zahtevaj_admin_pravice(current_user: Dict[str, Any] = Depends(zahtevaj_avtentikacijo)):
+def zahtevaj_identiteto(current_user: Dict[str, Any] = Depends(get_current_identity)):
     """
-    Zahteva, da je uporabnik tipa admin.
+    Zahteva avtentikacijo, za endpointe, ki potrebujejo le identiteto uporabnika.
+    """
+    if not current_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Za dostop se morate prijaviti",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return current_user
+
+
+def zahtevaj_admin_pravice(current_user: Dict[str, Any] = Depends(zahtevaj_identiteto)):
+    """
+    Zahteva, da je uporabnik tipa admin (iz claimov tokena, brez branja baze).
     """
     if current_user.get("tip_uporabnika") != "admin":
         raise HTTPException(
@@ -513,7 +653,7 @@ def zahtevaj_admin_pravice(current_user: Dict[str, Any] = Depends(zahtevaj_avten
     return current_user
 
 
-def pridobi_veselico_za_uporabnika(user_id: str) -> Optional[str]:
+async def pridobi_veselico_za_uporabnika(user_id: str) -> Optional[str]:
     """
     Poišči veselico, na katero je uporabnik prijavljen.
     Vrne ID veselice ali None, če ni prijavljen na nobeno veselico.
@@ -522,7 +662,7 @@ def pridobi_veselico_za_uporabnika(user_id: str) -> Optional[str]:
         return None
 
     try:
-        veselica = veselice_collection.find_one({
+        veselica = await veselice_collection.find_one({
             "prijavljeni_uporabniki": {"$in": [user_id]}
         })
 
@@ -534,7 +674,42 @@ def pridobi_veselico_za_uporabnika(user_id: str) -> Optional[str]:
     return None
 
 
-def ustvari_sejo(user_id: str, username: str) -> str:
+async def pridobi_veselice_za_uporabnike(user_ids: List[str]) -> Dict[str, str]:
+    """
+    Za več uporabnikov hkrati poišči veselico, na katero so prijavljeni (ena agregacija).
+    Vrne {id uporabnika: id veselice} za prijavljene uporabnike.
+    """
+    if mongo_client is None or veselice_collection is None or not user_ids:
+        return {}
+
+    try:
+        pairs = await veselice_collection.aggregate([
+            {"$match": {"prijavljeni_uporabniki": {"$in": user_ids}}},
+            {"$project": {"prijavljeni_uporabniki": 1}},
+            {"$unwind": "$prijavljeni_uporabniki"},
+            {"$match": {"prijavljeni_uporabniki": {"$in": user_ids}}},
+            {"$group": {"_id": "$prijavljeni_uporabniki", "veselica": {"$first": "$_id"}}}
+        ]).to_list(None)
+        return {pair["_id"]: str(pair["veselica"]) for pair in pairs}
+    except Exception:
+        return {}
+
+
+async def odgovori_uporabnikov(users: List[Dict[str, Any]]) -> List[OdgovorUporabnika]:
+    """
+    Pretvori uporabnike (prebrane s UPORABNIK_PROJEKCIJA) v OdgovorUporabnika z id_veselica.
+    """
+    veselice = await pridobi_veselice_za_uporabnike([str(user["_id"]) for user in users])
+    user_responses = []
+    for user in users:
+        user["id"] = str(user["_id"])
+        if user["id"] in veselice:
+            user["id_veselica"] = veselice[user["id"]]
+        user_responses.append(OdgovorUporabnika(**user))
+    return user_responses
+
+
+async def ustvari_sejo(user_id: str, username: str) -> str:
     """
     Ustvari novo sejo v MongoDB.
     """
@@ -552,7 +727,7 @@ def ustvari_sejo(user_id: str, username: str) -> str:
     }
 
     try:
-        sessions_collection.insert_one(session_data)
+        await sessions_collection.insert_one(session_data)
         return session_token
     except Exception as e:
         raise HTTPException(
@@ -561,7 +736,7 @@ def ustvari_sejo(user_id: str, username: str) -> str:
         )
 
 
-def pridobi_sejo(session_token: str) -> Optional[dict]:
+async def pridobi_sejo(session_token: str) -> Optional[dict]:
     """
     Pridobi sejo iz MongoDB.
     """
@@ -569,7 +744,7 @@ def pridobi_sejo(session_token: str) -> Optional[dict]:
         return None
 
     try:
-        session_data = sessions_collection.find_one({
+        session_data = await sessions_collection.find_one({
             "session_token": session_token,
             "type": "session",
             "expires_at": {"$gt": datetime.utcnow()}
@@ -584,18 +759,19 @@ def pridobi_sejo(session_token: str) -> Optional[dict]:
     return None
 
 
-def prekini_sejo(session_token: str):
+async def prekini_sejo(session_token: str):
     """
     Prekini sejo v MongoDB.
     """
     if mongo_client is not None and sessions_collection is not None and session_token:
         try:
-            sessions_collection.delete_one({"session_token": session_token})
+            # Delni indeks session_token_unique (type "session") se uporabi le, če filter vsebuje type
+            await sessions_collection.delete_one({"session_token": session_token, "type": "session"})
         except Exception:
             pass
 
 
-def dodaj_token_na_crno_listo(token: str):
+async def dodaj_token_na_crno_listo(token: str):
     """
     Dodaj token na črno listo (preklicane tokenje).
     """
@@ -612,7 +788,7 @@ def dodaj_token_na_crno_listo(token: str):
             exp_timestamp = payload.get("exp")
 
             if token_id and exp_timestamp:
-                expires_at = datetime.fromtimestamp(exp_timestamp)
+                expires_at = datetime.utcfromtimestamp(exp_timestamp)
 
                 blacklist_entry = {
                     "token_id": token_id,
@@ -621,17 +797,39 @@ def dodaj_token_na_crno_listo(token: str):
                     "type": "blacklist"
                 }
 
-                sessions_collection.insert_one(blacklist_entry)
+                await sessions_collection.insert_one(blacklist_entry)
+                revocation_cache.add(token_id, expires_at)
         except Exception:
             pass
 
 
-def zakodiraj_geslo(geslo: str) -> str:
-    return pwd_context.hash(geslo)
+def _bazen_gesel_zaseden():
+    return HTTPException(
+        status_code=503,
+        detail="Preveč hkratnih prijav, poskusite znova čez trenutek",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def zakodiraj_geslo(geslo: str) -> str:
+    """
+    Zakodira geslo (argon2) v password_pool, ne na niti event loopa. Ko je bazen poln, vrne 503.
+    """
+    try:
+        return await password_pool.hash(geslo)
+    except PasswordPoolSaturated:
+        raise _bazen_gesel_zaseden()
 
 
-def preveri_geslo(geslo: str, zakodirano_geslo: str) -> bool:
-    return pwd_context.verify(geslo, zakodirano_geslo)
+async def preveri_geslo(geslo: str, zakodirano_geslo: str):
+    """
+    Preveri geslo v password_pool. Vrne (ujemanje, nova zgoščena vrednost ali None);
+    nova vrednost je nastavljena, kadar so parametri argon2 zastareli.
+    """
+    try:
+        return await password_pool.verify_and_update(geslo, zakodirano_geslo)
+    except PasswordPoolSaturated:
+        raise _bazen_gesel_zaseden()
 
 
 @app.post("/uporabnik/registracija", tags=["Sistem registracije in prijave"], response_model=OdgovorUporabnika)
@@ -641,7 +839,6 @@ async def registracija(request: Request, podatki: UstvariUporabnika):
     """
     print("Registration called")
     log_request(request, "Klic storitve POST /uporabnik/registracija")
-    poslji_statistiko("/uporabnik/registracija")
     if mongo_client is None:
         raise HTTPException(status_code=503, detail="Baza ni na voljo")
 
@@ -649,7 +846,7 @@ async def registracija(request: Request, podatki: UstvariUporabnika):
         raise HTTPException(
             status_code=400, detail="Geslo mora biti vsaj 4 znake dolgo")
 
-    if users_collection.find_one({"$or": [
+    if await users_collection.find_one({"$or": [
         {"uporabnisko_ime": podatki.uporabnisko_ime},
         {"email": podatki.email}
     ]}):
@@ -657,13 +854,18 @@ async def registracija(request: Request, podatki: UstvariUporabnika):
             status_code=400, detail="Uporabniško ime ali email že obstaja")
 
     uporabnik = podatki.model_dump()
-    uporabnik["zakodirano_geslo"] = zakodiraj_geslo(podatki.geslo)
+    uporabnik["zakodirano_geslo"] = await zakodiraj_geslo(podatki.geslo)
     uporabnik["tip_uporabnika"] = "normal"
     uporabnik["ustvarjeno"] = datetime.utcnow()
     uporabnik["posodobljeno"] = None
     del uporabnik["geslo"]
 
-    result = users_collection.insert_one(uporabnik)
+    try:
+        result = await users_collection.insert_one(uporabnik)
+    except DuplicateKeyError:
+        # Hkratna registracija z istim imenom ali emailom je prehitela zgornje preverjanje
+        raise HTTPException(
+            status_code=400, detail="Uporabniško ime ali email že obstaja")
     uporabnik["id"] = str(result.inserted_id)
 
     return OdgovorUporabnika(**uporabnik)
@@ -676,19 +878,31 @@ async def prijava(request: Request, podatki: PrijavaUporabnika, response: Respon
     Vrne JWT access in refresh token.
     """
     log_request(request, "Klic storitve POST /uporabnik/prijava")
-    poslji_statistiko("/uporabnik/prijava")
     if mongo_client is None:
         raise HTTPException(status_code=503, detail="Storitev ni na voljo")
 
-    user = users_collection.find_one({"$or": [
+    user = await users_collection.find_one({"$or": [
         {"uporabnisko_ime": podatki.uporabnisko_ime_ali_email},
         {"email": podatki.uporabnisko_ime_ali_email}
     ]})
 
-    if not user or not preveri_geslo(podatki.geslo, user["zakodirano_geslo"]):
+    if not user:
         raise HTTPException(
             status_code=401, detail="Napačno uporabniško ime/email ali geslo")
 
+    ujemanje, novo_zakodirano_geslo = await preveri_geslo(podatki.geslo, user["zakodirano_geslo"])
+    if not ujemanje:
+        raise HTTPException(
+            status_code=401, detail="Napačno uporabniško ime/email ali geslo")
+
+    if novo_zakodirano_geslo:
+        # Geslo je bilo zakodirano s starejšimi parametri argon2
+        await users_collection.update_one(
+            {"_id": user["_id"], "zakodirano_geslo": user["zakodirano_geslo"]},
+            {"$set": {"zakodirano_geslo": novo_zakodirano_geslo}}
+        )
+        user_cache.invalidate(str(user["_id"]))
+
     access_token = ustvari_access_token(user)
     refresh_token = ustvari_refresh_token(str(user["_id"]))
 
@@ -706,14 +920,14 @@ async def prijava(request: Request, podatki: PrijavaUporabnika, response: Respon
                 "user_id": str(user["_id"]),
                 "type": "refresh_token",
                 "created_at": datetime.utcnow(),
-                "expires_at": datetime.fromtimestamp(refresh_payload.get("exp"))
+                "expires_at": datetime.utcfromtimestamp(refresh_payload.get("exp"))
             }
 
-            sessions_collection.insert_one(refresh_token_data)
+            await sessions_collection.insert_one(refresh_token_data)
         except Exception as e:
             print(f"Napaka pri shranjevanju refresh tokena: {e}")
 
-    session_token = ustvari_sejo(str(user["_id"]), user["uporabnisko_ime"])
+    session_token = await ustvari_sejo(str(user["_id"]), user["uporabnisko_ime"])
 
     response.set_cookie(
         key="session_token",
@@ -746,9 +960,8 @@ async def osvezi_token(request: Request, podatki: RefreshTokenRequest):
     Osveži access token z uporabo refresh tokena.
     """
     log_request(request, "Klic storitve POST /auth/refresh")
-    poslji_statistiko("/auth/refresh")
     try:
-        payload = preveri_jwt_token(
+        payload = await preveri_jwt_token(
             podatki.refresh_token, token_type="refresh")
 
         user_id = payload.get("sub")
@@ -761,7 +974,7 @@ async def osvezi_token(request: Request, podatki: RefreshTokenRequest):
             )
 
         if mongo_client is not None and sessions_collection is not None:
-            stored_token = sessions_collection.find_one({
+            stored_token = await sessions_collection.find_one({
                 "token_id": token_id,
                 "user_id": user_id,
                 "type": "refresh_token"
@@ -774,10 +987,10 @@ async def osvezi_token(request: Request, podatki: RefreshTokenRequest):
                         "user_id": user_id,
                         "type": "refresh_token",
                         "created_at": datetime.utcnow(),
-                        "expires_at": datetime.fromtimestamp(payload.get("exp"))
+                        "expires_at": datetime.utcfromtimestamp(payload.get("exp"))
                     }
 
-                    sessions_collection.insert_one(refresh_token_data)
+                    await sessions_collection.insert_one(refresh_token_data)
                     print(f"Dodan nov refresh token v bazo: {token_id}")
                 except Exception as e:
                     print(
@@ -786,7 +999,7 @@ async def osvezi_token(request: Request, podatki: RefreshTokenRequest):
         if mongo_client is None:
             raise HTTPException(status_code=503, detail="Baza ni na voljo")
 
-        user = users_collection.find_one({"_id": ObjectId(user_id)})
+        user = await users_collection.find_one({"_id": ObjectId(user_id)})
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -825,16 +1038,15 @@ async def odjava(request: Request, response: Response, current_user: dict = Depe
     Odjava trenutnega uporabnika. Prekliče JWT token in sejo.
     """
     log_request(request, "Klic storitve POST /uporabnik/odjava")
-    poslji_statistiko("/uporabnik/odjava")
     session_token = request.cookies.get("session_token")
 
     if session_token:
-        prekini_sejo(session_token)
+        await prekini_sejo(session_token)
 
     auth_header = request.headers.get("Authorization")
     if auth_header and auth_header.startswith("Bearer "):
         token = auth_header.replace("Bearer ", "")
-        dodaj_token_na_crno_listo(token)
+        await dodaj_token_na_crno_listo(token)
 
     response.delete_cookie("session_token")
 
@@ -847,11 +1059,10 @@ async def prijavljen_uporabnik(request: Request, current_user: dict = Depends(za
     Pridobi podatke o prijavljenem uporabniku in vrne nove JWT tokene.
     """
     log_request(request, "Klic storitve GET /uporabnik/prijavljen")
-    poslji_statistiko("/uporabnik/prijavljen")
     access_token = ustvari_access_token(current_user)
     refresh_token = ustvari_refresh_token(current_user["id"])
 
-    id_veselice = pridobi_veselico_za_uporabnika(current_user["id"])
+    id_veselice = await pridobi_veselico_za_uporabnika(current_user["id"])
 
     user_data = current_user.copy()
     if id_veselice:
@@ -868,39 +1079,64 @@ async def prijavljen_uporabnik(request: Request, current_user: dict = Depends(za
 
 
 @app.get("/uporabniki", tags=["Podatki uporabnika"], response_model=List[OdgovorUporabnika])
-async def vsi_uporabniki(request: Request, current_user: dict = Depends(zahtevaj_avtentikacijo)):
+async def vsi_uporabniki(
+    request: Request,
+    response: Response,
+    limit: int = Query(USERS_PAGE_SIZE, ge=1, le=USERS_MAX_PAGE_SIZE),
+    po: Optional[str] = Query(None, description="ID zadnjega uporabnika prejšnje strani"),
+    current_user: dict = Depends(zahtevaj_avtentikacijo)
+):
     """
-    Pridobi seznam vseh uporabnikov. 
+    Pridobi stran uporabnikov, urejeno po ID.
+    Naslednjo stran dobimo s parametrom `po` iz glave X-Next-Cursor, ki je na zadnji strani ni.
     """
     log_request(request, "Klic storitve GET /uporabniki")
-    poslji_statistiko("/uporabniki")
     if mongo_client is None:
         raise HTTPException(status_code=503, detail="Baza ni na voljo")
 
-    try:
-        users = list(users_collection.find())
-        user_responses = []
-
-        for user in users:
-            user["id"] = str(user["_id"])
+    if po is not None and not ObjectId.is_valid(po):
+        raise HTTPException(status_code=400, detail="Neveljaven parameter 'po'")
 
-            id_veselice = pridobi_veselico_za_uporabnika(user["id"])
-            user_response = OdgovorUporabnika(**user)
+    try:
+        query = {"_id": {"$gt": ObjectId(po)}} if po else {}
+        users = await users_collection.find(query, UPORABNIK_PROJEKCIJA).sort("_id", 1).limit(limit).to_list(None)
 
-            if id_veselice:
-                user_response_dict = user_response.dict()
-                user_response_dict["id_veselica"] = id_veselice
-                user_responses.append(OdgovorUporabnika(**user_response_dict))
-            else:
-                user_responses.append(user_response)
+        if len(users) == limit:
+            response.headers["X-Next-Cursor"] = str(users[-1]["_id"])
 
-        return user_responses
+        return await odgovori_uporabnikov(users)
 
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Napaka pri pridobivanju uporabnikov: {str(e)}")
 
 
+@app.get("/uporabniki/izvoz", tags=["Podatki uporabnika"])
+async def izvoz_uporabnikov(request: Request, current_user: dict = Depends(zahtevaj_admin_pravice)):
+    """
+    Izvoz vseh uporabnikov kot NDJSON (en uporabnik na vrstico), pretočno po paketih.
+    Dostop imajo samo uporabniki tipa admin.
+    """
+    log_request(request, "Klic storitve GET /uporabniki/izvoz")
+    if mongo_client is None:
+        raise HTTPException(status_code=503, detail="Baza ni na voljo")
+
+    async def vrstice():
+        query = {}
+        while True:
+            users = await users_collection.find(query, UPORABNIK_PROJEKCIJA).sort("_id", 1).limit(USERS_EXPORT_BATCH_SIZE).to_list(None)
+            if not users:
+                return
+            yield "".join(user.model_dump_json() + "\n" for user in await odgovori_uporabnikov(users))
+            query = {"_id": {"$gt": users[-1]["_id"]}}
+
+    return StreamingResponse(
+        vrstice(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=uporabniki.ndjson"}
+    )
+
+
 @app.put("/uporabnik/posodobi-uporabnika", tags=["Posodobi uporabnika"], response_model=OdgovorUporabnika)
 async def posodobi_uporabnika(
     request: Request,
@@ -911,14 +1147,13 @@ async def posodobi_uporabnika(
     Posodobi podatke trenutnega uporabnika.
     """
     log_request(request, "Klic storitve PUT /uporabnik/posodobi-uporabnika")
-    poslji_statistiko("/uporabnik/posodobi-uporabnika")
     if mongo_client is None:
         raise HTTPException(status_code=503, detail="Baza ni na voljo")
 
     try:
         update_data = {}
         if podatki.uporabnisko_ime is not None:
-            existing_user = users_collection.find_one({
+            existing_user = await users_collection.find_one({
                 "uporabnisko_ime": podatki.uporabnisko_ime,
                 "_id": {"$ne": ObjectId(current_user["id"])}
             })
@@ -929,7 +1164,7 @@ async def posodobi_uporabnika(
                 )
             update_data["uporabnisko_ime"] = podatki.uporabnisko_ime
         if podatki.email is not None:
-            existing_user = users_collection.find_one({
+            existing_user = await users_collection.find_one({
                 "email": podatki.email,
                 "_id": {"$ne": ObjectId(current_user["id"])}
             })
@@ -953,7 +1188,7 @@ async def posodobi_uporabnika(
                     status_code=400,
                     detail="Geslo mora biti vsaj 4 znake dolgo"
                 )
-            update_data["zakodirano_geslo"] = zakodiraj_geslo(podatki.geslo)
+            update_data["zakodirano_geslo"] = await zakodiraj_geslo(podatki.geslo)
 
         if not update_data:
             raise HTTPException(
@@ -963,10 +1198,17 @@ async def posodobi_uporabnika(
 
         update_data["posodobljeno"] = datetime.utcnow()
 
-        result = users_collection.update_one(
-            {"_id": ObjectId(current_user["id"])},
-            {"$set": update_data}
-        )
+        try:
+            result = await users_collection.update_one(
+                {"_id": ObjectId(current_user["id"])},
+                {"$set": update_data}
+            )
+        except DuplicateKeyError:
+            raise HTTPException(
+                status_code=400,
+                detail="Uporabniško ime ali email že obstaja"
+            )
+        user_cache.invalidate(current_user["id"])
 
         if result.modified_count == 0:
             raise HTTPException(
@@ -974,7 +1216,7 @@ async def posodobi_uporabnika(
                 detail="Napaka pri posodabljanju uporabnika"
             )
 
-        updated_user = users_collection.find_one(
+        updated_user = await users_collection.find_one(
             {"_id": ObjectId(current_user["id"])})
         updated_user["id"] = str(updated_user["_id"])
 
@@ -998,7 +1240,6 @@ async def spremeni_geslo(
     Spremeni geslo trenutnega uporabnika.
     """
     log_request(request, "Klic storitve PATCH /uporabnik/posodobi-uporabnika/spremeni-geslo")
-    poslji_statistiko("/uporabnik/posodobi-uporabnika/spremeni-geslo")
     if mongo_client is None:
         raise HTTPException(status_code=503, detail="Baza ni na voljo")
 
@@ -1016,14 +1257,15 @@ async def spremeni_geslo(
                 detail="Geslo mora biti vsaj 4 znake dolgo"
             )
 
-        novo_zakodirano_geslo = zakodiraj_geslo(podatki.novo_geslo)
-        result = users_collection.update_one(
+        novo_zakodirano_geslo = await zakodiraj_geslo(podatki.novo_geslo)
+        result = await users_collection.update_one(
             {"_id": ObjectId(current_user["id"])},
             {"$set": {
                 "zakodirano_geslo": novo_zakodirano_geslo,
                 "posodobljeno": datetime.utcnow()
             }}
         )
+        user_cache.invalidate(current_user["id"])
 
         if result.matched_count == 0:
             raise HTTPException(
@@ -1066,7 +1308,6 @@ async def izbrisi_racun(
     """
     Izbriši račun trenutnega uporabnika.
     """
-    poslji_statistiko("/uporabnik/izbrisi-racun")
     if mongo_client is None:
         raise HTTPException(status_code=503, detail="Baza ni na voljo")
 
@@ -1079,10 +1320,11 @@ async def izbrisi_racun(
                 "type": "refresh_token"
             })
 
-            for token_doc in refresh_tokens:
-                dodaj_token_na_crno_listo(token_doc.get("token_id", ""))
+            async for token_doc in refresh_tokens:
+                await dodaj_token_na_crno_listo(token_doc.get("token_id", ""))
 
-        result = users_collection.delete_one({"_id": ObjectId(user_id)})
+        result = await users_collection.delete_one({"_id": ObjectId(user_id)})
+        user_cache.invalidate(user_id)
 
         if result.deleted_count == 0:
             raise HTTPException(
@@ -1092,7 +1334,7 @@ async def izbrisi_racun(
 
         session_token = request.cookies.get("session_token")
         if session_token:
-            prekini_sejo(session_token)
+            await prekini_sejo(session_token)
 
         response.delete_cookie("session_token")
 
@@ -1123,13 +1365,12 @@ async def izbrisi_uporabnika_po_uporabniskem_imenu(
     Izbriši uporabnika po uporabniškem imenu. 
     """
     log_request(request, f"Klic storitve DELETE /uporabnik/izbrisi-racun/{uporabnisko_ime}")
-    poslji_statistiko(f"/uporabnik/izbrisi-racun/{uporabnisko_ime}")
     if mongo_client is None:
         raise HTTPException(status_code=503, detail="Baza ni na voljo")
 
     try:
 
-        user_to_delete = users_collection.find_one(
+        user_to_delete = await users_collection.find_one(
             {"uporabnisko_ime": uporabnisko_ime})
 
         if not user_to_delete:
@@ -1147,11 +1388,12 @@ async def izbrisi_uporabnika_po_uporabniskem_imenu(
                 "type": "refresh_token"
             })
 
-            for token_doc in refresh_tokens:
-                dodaj_token_na_crno_listo(token_doc.get("token_id", ""))
+            async for token_doc in refresh_tokens:
+                await dodaj_token_na_crno_listo(token_doc.get("token_id", ""))
 
-        result = users_collection.delete_one(
+        result = await users_collection.delete_one(
             {"_id": ObjectId(user_to_delete_id)})
+        user_cache.invalidate(user_to_delete_id)
 
         if result.deleted_count == 0:
             raise HTTPException(
@@ -1160,7 +1402,7 @@ async def izbrisi_uporabnika_po_uporabniskem_imenu(
             )
 
         if mongo_client is not None and sessions_collection is not None:
-            sessions_collection.delete_many({"user_id": user_to_delete_id})
+            await sessions_collection.delete_many({"user_id": user_to_delete_id})
 
         if user_to_delete_id == current_user_id:
             response = {
@@ -1204,7 +1446,6 @@ async def ustvari_veselico(
     Dostop imajo samo uporabniki tipa admin.
     """
     log_request(request, "Klic storitve POST /veselice")
-    poslji_statistiko("/veselice")
     if mongo_client is None or veselice_collection is None:
         raise HTTPException(status_code=503, detail="Baza ni na voljo")
 
@@ -1220,7 +1461,7 @@ async def ustvari_veselico(
         if "max_udelezencev" not in veselica:
             veselica["max_udelezencev"] = 0
 
-        result = veselice_collection.insert_one(veselica)
+        result = await veselice_collection.insert_one(veselica)
         veselica["id"] = str(result.inserted_id)
 
         return OdgovorVeselice(**veselica)
@@ -1242,12 +1483,11 @@ async def pridobi_vse_veselice(
     Dostop imajo vsi prijavljeni uporabniki.
     """
     log_request(request, "Klic storitve GET /veselice")
-    poslji_statistiko("/veselice")
     if mongo_client is None or veselice_collection is None:
         raise HTTPException(status_code=503, detail="Baza ni na voljo")
 
     try:
-        veselice = list(veselice_collection.find())
+        veselice = await veselice_collection.find().to_list(None)
         for veselica in veselice:
             veselica["id"] = str(veselica["_id"])
         return [OdgovorVeselice(**veselica) for veselica in veselice]
@@ -1269,12 +1509,11 @@ async def pridobi_veselico(
     Pridobi podatke o posamezni veselici.
     """
     log_request(request, f"Klic storitve GET /veselice/{veselica_id}")
-    poslji_statistiko(f"/veselice/{veselica_id}")
     if mongo_client is None or veselice_collection is None:
         raise HTTPException(status_code=503, detail="Baza ni na voljo")
 
     try:
-        veselica = veselice_collection.find_one({"_id": ObjectId(veselica_id)})
+        veselica = await veselice_collection.find_one({"_id": ObjectId(veselica_id)})
         if not veselica:
             raise HTTPException(
                 status_code=404,
@@ -1301,7 +1540,7 @@ async def pridobi_veselico(
                 {"uporabnisko_ime": 1}
             )
             
-            for user in users:
+            async for user in users:
                 prijavljeni_podatki.append(user["uporabnisko_ime"])
         
         veselica["prijavljeni_uporabniki_podatki"] = prijavljeni_podatki
@@ -1327,12 +1566,11 @@ async def prijava_na_veselico(
     Prijavi trenutnega uporabnika na veselico.
     """
     log_request(request, f"Klic storitve POST /veselice/{veselica_id}/prijava")
-    poslji_statistiko(f"/veselice/{veselica_id}/prijava")
     if mongo_client is None or veselice_collection is None:
         raise HTTPException(status_code=503, detail="Baza ni na voljo")
 
     try:
-        veselica = veselice_collection.find_one({"_id": ObjectId(veselica_id)})
+        veselica = await veselice_collection.find_one({"_id": ObjectId(veselica_id)})
         if not veselica:
             raise HTTPException(
                 status_code=404,
@@ -1357,7 +1595,7 @@ async def prijava_na_veselico(
                 detail="Veselica je že polna"
             )
 
-        result = veselice_collection.update_one(
+        result = await veselice_collection.update_one(
             {"_id": ObjectId(veselica_id)},
             {
                 "$push": {"prijavljeni_uporabniki": user_id},
@@ -1405,12 +1643,11 @@ async def odjava_z_veselice(
     Odjavi trenutnega uporabnika z veselice.
     """
     log_request(request, f"Klic storitve POST /veselice/{veselica_id}/odjava")
-    poslji_statistiko(f"/veselice/{veselica_id}/odjava")
     if mongo_client is None or veselice_collection is None:
         raise HTTPException(status_code=503, detail="Baza ni na voljo")
 
     try:
-        veselica = veselice_collection.find_one({"_id": ObjectId(veselica_id)})
+        veselica = await veselice_collection.find_one({"_id": ObjectId(veselica_id)})
         if not veselica:
             raise HTTPException(
                 status_code=404,
@@ -1426,7 +1663,7 @@ async def odjava_z_veselice(
                 detail="Niste prijavljeni na to veselico"
             )
 
-        result = veselice_collection.update_one(
+        result = await veselice_collection.update_one(
             {"_id": ObjectId(veselica_id)},
             {
                 "$pull": {"prijavljeni_uporabniki": user_id},
@@ -1473,19 +1710,18 @@ async def izbrisi_veselico(
     Dostop imajo samo uporabniki tipa admin.
     """
     log_request(request, f"Klic storitve DELETE /veselice/{veselica_id}")
-    poslji_statistiko(f"/veselice/{veselica_id}")
     if mongo_client is None or veselice_collection is None:
         raise HTTPException(status_code=503, detail="Baza ni na voljo")
 
     try:
-        veselica = veselice_collection.find_one({"_id": ObjectId(veselica_id)})
+        veselica = await veselice_collection.find_one({"_id": ObjectId(veselica_id)})
         if not veselica:
             raise HTTPException(
                 status_code=404,
                 detail="Veselica ne obstaja"
             )
 
-        result = veselice_collection.delete_one({"_id": ObjectId(veselica_id)})
+        result = await veselice_collection.delete_one({"_id": ObjectId(veselica_id)})
 
         if result.deleted_count == 0:
             raise HTTPException(
@@ -1517,9 +1753,8 @@ async def verify_token_via_body(request: Request, podatki: TokenForVerification)
     Uporabno za direktno testiranje brez Authorization headerja.
     """
     log_request(request, "Klic storitve POST /auth/verify-token")
-    poslji_statistiko("/auth/verify-token")
     try:
-        payload = preveri_jwt_token(podatki.token, token_type="access")
+        payload = await preveri_jwt_token(podatki.token, token_type="access")
         return {
             "valid": True,
             "user_id": payload.get("sub"),
@@ -1534,6 +1769,18 @@ async def verify_token_via_body(request: Request, podatki: TokenForVerification)
         }
 
 
+@app.get("/interno/stats", tags=["Interno"])
+async def interna_statistika():
+    """Števci predpomnilnikov, pošiljanja logov (s spoolom) in statistike te instance."""
+    return {
+        "user_cache": user_cache.stats(),
+        "revocation_cache": revocation_cache.stats(),
+        "log_sink": log_sink.stats(),
+        "log_sampler": log_sampler.stats(),
+        "statistika": statistika_buffer.stats(),
+    }
+
+
 @app.middleware("http")
 async def preveri_jwt_middleware(request: Request, call_next):
     """
@@ -1554,7 +1801,7 @@ async def preveri_jwt_middleware(request: Request, call_next):
     if auth_header and auth_header.startswith("Bearer "):
         try:
             token = auth_header.replace("Bearer ", "")
-            payload = preveri_jwt_token(token, token_type="access")
+            payload = await preveri_jwt_za_zahtevek(request, token, token_type="access")
             request.state.user_id = payload.get("sub")
             request.state.user_data = payload
         except HTTPException as e:
@@ -1566,10 +1813,16 @@ async def preveri_jwt_middleware(request: Request, call_next):
         except Exception:
             pass
 
-    return await call_next(request)
+    response = await call_next(request)
+    verifications = getattr(request.state, "jwt_verifications", 0)
+    if verifications:
+        response.headers["Server-Timing"] = (
+            f'jwt;dur={request.state.jwt_verify_ms:.3f};desc="{verifications} verification(s)"'
+        )
+    return response
 
 
-def ustvari_admin_racun():
+async def ustvari_admin_racun():
     """
     Ustvari admin uporabnika, če še ne obstaja.
     """
@@ -1578,13 +1831,13 @@ def ustvari_admin_racun():
             print("Users collection ni inicializiran")
             return
 
-        admin_user = users_collection.find_one({"uporabnisko_ime": "admin"})
+        admin_user = await users_collection.find_one({"uporabnisko_ime": "admin"})
 
         if not admin_user:
             admin_data = {
                 "uporabnisko_ime": "admin",
                 "email": "admin@example.com",
-                "zakodirano_geslo": zakodiraj_geslo("admin"),
+                "zakodirano_geslo": hash_password("admin"),
                 "ime": "Administrator",
                 "priimek": "Sistema",
                 "tip_uporabnika": "admin",
@@ -1593,7 +1846,7 @@ def ustvari_admin_racun():
                 "id_veselica": None
             }
 
-            result = users_collection.insert_one(admin_data)
+            result = await users_collection.insert_one(admin_data)
             print(
                 f"Admin uporabnik uspešno ustvarjen z ID: {result.inserted_id}")
             print("Prijavni podatki: uporabnisko_ime=admin, geslo=admin")
@@ -1604,12 +1857,44 @@ def ustvari_admin_racun():
         print(f"Napaka pri ustvarjanju admin uporabnika: {e}")
 
 
+def ustvari_indekse():
+    """
+    Ustvari indekse iz indexes.py. mongo_indexes je skupen s sinhronimi storitvami,
+    zato za gradnjo uporabimo kratkotrajen sinhron odjemalec.
+    """
+    client = MongoClient(MONGODB_URL, serverSelectionTimeoutMS=5000)
+    try:
+        ensure_indexes(client["uporabniski_sistem"], INDEXES)
+    finally:
+        client.close()
+
+
 @app.on_event("startup")
 async def startup_event():
-    ustvari_admin_racun()
+    await init_database()
+    await log_sink.start()
+    await statistika_buffer.start()
+    if MONGO_ENSURE_INDEXES and mongo_client is not None:
+        try:
+            await asyncio.to_thread(ustvari_indekse)
+        except Exception as e:
+            print(f"Napaka pri ustvarjanju indeksov: {e}")
+    if REVOCATION_CACHE_ENABLED:
+        await revocation_cache.start(sessions_collection)
+    await ustvari_admin_racun()
     print(f"Swagger UI: http://localhost:{SERVICE_PORT}/docs")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await revocation_cache.stop()
+    password_pool.shutdown()
+    await statistika_buffer.stop()
+    await log_sink.stop()
+    if mongo_client is not None:
+        mongo_client.close()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))
+USER_CACHE_TTL_SECONDS = float(os.getenv('USER_CACHE_TTL_SECONDS', 30))
+
+
+class UserCache:
+    """
+    LRU predpomnilnik uporabniških dokumentov po id z omejeno življenjsko dobo (TTL).
+
+    Spremembe uporabnika na tej instanci vnos takoj odstranijo (invalidate); spremembe
+    na drugih instancah so vidne najkasneje po `ttl` sekundah. get vrne kopijo, da
+    klicatelj ne spreminja shranjenega dokumenta. maxsize 0 predpomnilnik izklopi.
+    """
+
+    def __init__(self, maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def generation(self):
+        """Preberi pred branjem iz baze in podaj v put; vmesna invalidacija tako zavrže zastarel dokument."""
+        return self._generation
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, user_id, user, generation=None):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[user_id] = (time.monotonic() + self.ttl, dict(user))
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generation += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+user_cache = UserCache()
@@ -0,0 +1,67 @@
+"""
+Micro-benchmark of log parsing throughput per wire format.
+
+    python bench_parser.py -n 200000
+"""
+import argparse
+import json
+import re
+import time
+from datetime import datetime
+
+from log_format import parse_log_body
+
+# The parser as it was before the structured envelope, for comparison
+OLD_PATTERN = r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) (\w+) (.+?) Correlation: ([a-f0-9-]+) \[(.+?)\] - (.+)'
+
+
+def old_parse_log_message(log_message: str):
+    match = re.match(OLD_PATTERN, log_message)
+    timestamp_str, level, url, correlation_id, app_name, message = match.groups()
+    return {
+        "timestamp": datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S,%f'),
+        "level": level,
+        "url": url,
+        "correlation_id": correlation_id,
+        "app_name": app_name,
+        "message": message
+    }
+
+
+def sample_messages(n):
+    legacy, envelope = [], []
+    for i in range(n):
+        cid = f"4f0d4e97-2f1d-446f-b894-{i:012x}"
+        legacy.append(
+            f"2025-12-28 21:18:20,{i % 1000:03d} INFO http://localhost:8002/uporabnik/prijava "
+            f"Correlation: {cid} [storitev_uporabniskega_sistema] - Klic storitve POST /uporabnik/prijava".encode('utf-8')
+        )
+        envelope.append(json.dumps({
+            "v": 1, "ts": 1766956700132 + i, "level": "INFO",
+            "url": "http://localhost:8002/uporabnik/prijava", "correlation_id": cid,
+            "app_name": "storitev_uporabniskega_sistema", "message": "Klic storitve POST /uporabnik/prijava"
+        }, separators=(',', ':')).encode('utf-8'))
+    return legacy, envelope
+
+
+def run(label, fn, messages):
+    start = time.perf_counter()
+    for body in messages:
+        fn(body)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {len(messages) / elapsed:>12,.0f} msg/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=100000)
+    args = parser.parse_args()
+
+    legacy, envelope = sample_messages(args.n)
+    run("legacy line, old parser", lambda body: old_parse_log_message(body.decode('utf-8')), legacy)
+    run("legacy line, fallback parser", parse_log_body, legacy)
+    run("json envelope v1", parse_log_body, envelope)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import os
+import threading
+import time
+
+from pymongo.errors import BulkWriteError
+
+CONSUMER_PREFETCH = int(os.getenv('LOG_CONSUMER_PREFETCH', 2000))
+CONSUMER_BATCH_SIZE = int(os.getenv('LOG_CONSUMER_BATCH_SIZE', 1000))
+CONSUMER_FLUSH_INTERVAL = float(os.getenv('LOG_CONSUMER_FLUSH_INTERVAL', 0.5))
+CONSUMER_LAG_INTERVAL = float(os.getenv('LOG_CONSUMER_LAG_INTERVAL', 5))
+CONSUMER_RECONNECT_MAX_DELAY = float(os.getenv('LOG_CONSUMER_RECONNECT_MAX_DELAY', 30))
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class LogConsumer:
+    """
+    Long-running RabbitMQ consumer that stores logs in Mongo in bulk.
+
+    Messages are buffered up to `batch_size` or `flush_interval` seconds and
+    written with a single unordered insert_many. Deliveries are acked only
+    after the write, so a crash before the write leaves them on the queue.
+    """
+
+    def __init__(self, connection_factory, collection, parse, queue_name,
+                 prefetch=CONSUMER_PREFETCH, batch_size=CONSUMER_BATCH_SIZE,
+                 flush_interval=CONSUMER_FLUSH_INTERVAL):
+        self.connection_factory = connection_factory
+        self.collection = collection
+        self.parse = parse
+        self.queue_name = queue_name
+        self.prefetch = prefetch
+        # A batch can never be larger than what the broker lets us hold unacked
+        self.batch_size = min(batch_size, prefetch)
+        self.flush_interval = flush_interval
+
+        self._connection = None
+        self._channel = None
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.consumed = 0
+        self.inserted = 0
+        self.failed = 0
+        self.batches = 0
+        self.queue_depth = None
+        self.last_error = None
+        self._rate_window_start = time.monotonic()
+        self._rate_window_inserted = 0
+        self.throughput = 0.0
+        self._last_lag_check = 0.0
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="log-consumer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "consumed": self.consumed,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "batches": self.batches,
+            "buffered": len(self._buffer),
+            "queue_depth": self.queue_depth,
+            "lag": (self.queue_depth or 0) + len(self._buffer),
+            "throughput_per_s": round(self.throughput, 1),
+            "prefetch": self.prefetch,
+            "batch_size": self.batch_size,
+            "last_error": self.last_error,
+        }
+
+    def _connect(self):
+        self._connection = self.connection_factory()
+        self._channel = self._connection.channel()
+        self._channel.queue_declare(queue=self.queue_name, durable=True)
+        self._channel.basic_qos(prefetch_count=self.prefetch)
+        self._channel.basic_consume(queue=self.queue_name, on_message_callback=self._on_message, auto_ack=False)
+
+    def _disconnect(self):
+        try:
+            if self._connection is not None and self._connection.is_open:
+                self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+        self._channel = None
+        # Unacked deliveries are requeued by the broker when the channel closes
+        self._buffer = []
+
+    def _on_message(self, channel, method, properties, body):
+        self._buffer.append((method.delivery_tag, method.redelivered, self.parse(body)))
+        self.consumed += 1
+        if len(self._buffer) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        docs = [doc for _, _, doc in batch]
+        failed_indexes = set()
+        try:
+            self.collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                if error.get("code") != DUPLICATE_KEY_ERROR:
+                    failed_indexes.add(error["index"])
+            self.last_error = str(e)
+        except Exception:
+            # Nothing was written; requeue the whole batch and let the caller reconnect
+            self._channel.basic_nack(delivery_tag=batch[-1][0], multiple=True, requeue=True)
+            raise
+
+        if not failed_indexes:
+            self._channel.basic_ack(delivery_tag=batch[-1][0], multiple=True)
+        else:
+            for index, (delivery_tag, redelivered, _) in enumerate(batch):
+                if index not in failed_indexes:
+                    self._channel.basic_ack(delivery_tag=delivery_tag)
+                else:
+                    # Retry once, then give up on a message Mongo keeps rejecting
+                    self._channel.basic_nack(delivery_tag=delivery_tag, requeue=not redelivered)
+        written = len(batch) - len(failed_indexes)
+        self.inserted += written
+        self.failed += len(failed_indexes)
+        self.batches += 1
+        self._rate_window_inserted += written
+
+    def _update_metrics(self):
+        now = time.monotonic()
+        elapsed = now - self._rate_window_start
+        if elapsed >= 1.0:
+            self.throughput = self._rate_window_inserted / elapsed
+            self._rate_window_start = now
+            self._rate_window_inserted = 0
+        if now - self._last_lag_check >= CONSUMER_LAG_INTERVAL:
+            self._last_lag_check = now
+            result = self._channel.queue_declare(queue=self.queue_name, durable=True, passive=True)
+            self.queue_depth = result.method.message_count
+
+    def _run(self):
+        delay = 0.5
+        while not self._stop.is_set():
+            try:
+                if self._channel is None:
+                    self._connect()
+                    delay = 0.5
+                self._connection.process_data_events(time_limit=min(self.flush_interval, 0.1))
+                if time.monotonic() - self._last_flush >= self.flush_interval:
+                    self._flush()
+                self._update_metrics()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Log consumer error: {e}")
+                self._disconnect()
+                self._stop.wait(delay)
+                delay = min(delay * 2, CONSUMER_RECONNECT_MAX_DELAY)
+        try:
+            if self._channel is not None:
+                self._flush()
+        except Exception as e:
+            print(f"Log consumer error: {e}")
+        self._disconnect()
@@ -0,0 +1,254 @@
+"""
+Streaming import/export of log dumps.
+
+    python log_dump.py import logs.json [--batch-size 10000]
+    python log_dump.py export night.ndjson.gz --from 2025-12-28 --to 2025-12-29 [--level ERROR] [--app-name ...]
+
+Import accepts a JSON array (as written by mongoexport --jsonArray or the
+`logs.json` dump in the repo) or NDJSON, in UTF-8 or UTF-16, optionally
+gzipped, and never holds more than one read chunk and one batch in memory.
+Malformed documents, and documents still incomplete after --max-document-size
+characters, are skipped and counted; the import continues with the next one.
+Export writes NDJSON, gzipped when the file name ends in .gz.
+"""
+import argparse
+import codecs
+import gzip
+import io
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient, ASCENDING
+
+from storage import ensure_log_collection, to_storage_doc, from_storage_doc
+
+MONGODB_URL = os.getenv('MONGODB_URL', 'mongodb://logging-mongo:27017/logging_db')
+READ_CHUNK_SIZE = 1 << 20
+IMPORT_BATCH_SIZE = 10000
+MAX_DOCUMENT_SIZE = 16 << 20
+# Where the next document can start after skipping a bad one: an object at the start of a line
+_DOCUMENT_START = re.compile(r"\n[ \t]*\{")
+EPOCH = datetime(1970, 1, 1)
+
+
+def open_binary(path):
+    raw = sys.stdin.buffer if path == "-" else open(path, "rb")
+    stream = io.BufferedReader(raw) if not isinstance(raw, io.BufferedReader) else raw
+    if stream.peek(2)[:2] == b"\x1f\x8b":
+        stream = io.BufferedReader(gzip.GzipFile(fileobj=stream))
+    return stream
+
+
+def detect_encoding(head: bytes):
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if head.startswith(codecs.BOM_UTF16_LE) or head.startswith(codecs.BOM_UTF16_BE):
+        return "utf-16"
+    # JSON starts with an ASCII character, so a zero byte next to it means UTF-16 without a BOM
+    if len(head) >= 2 and head[0] == 0 and head[1] != 0:
+        return "utf-16-be"
+    if len(head) >= 2 and head[0] != 0 and head[1] == 0:
+        return "utf-16-le"
+    return "utf-8"
+
+
+def _skip_document(text_stream, buffer, position, chunk_size):
+    """Drops text up to the next line that starts an object. Returns (buffer, position, eof)."""
+    while True:
+        match = _DOCUMENT_START.search(buffer, position + 1)
+        if match:
+            return buffer, match.start(), False
+        # A line break at the very end may be followed by "{" in the next chunk
+        newline = buffer.rfind("\n", position + 1)
+        tail = buffer[newline:] if newline != -1 and not buffer[newline:].strip() else ""
+        more = text_stream.read(chunk_size)
+        if not more:
+            return "", 0, True
+        buffer, position = tail + more, -1
+
+
+def iter_json_documents(text_stream, chunk_size=READ_CHUNK_SIZE, max_document_size=MAX_DOCUMENT_SIZE,
+                        on_skipped=None):
+    """
+    Yields objects from a JSON array or NDJSON text stream, decoding one object at a time
+    from a sliding buffer instead of parsing the whole file.
+
+    A document that does not decode by the end of the input, or within `max_document_size`
+    characters, is skipped up to the next line that starts an object, and `on_skipped` is
+    called with the number of characters buffered for it. The buffer therefore never grows
+    past `max_document_size` plus one chunk, and one bad record does not abort the rest.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+    while True:
+        # Skip separators between documents: array brackets, commas and whitespace
+        while position < len(buffer) and buffer[position] in " \t\r\n,[]":
+            position += 1
+        if position >= len(buffer):
+            if eof:
+                return
+            buffer = text_stream.read(chunk_size)
+            position = 0
+            eof = not buffer
+            continue
+        try:
+            document, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # Still failing with the rest of the input (or the size cap) in the buffer: malformed
+            if eof or len(buffer) - position > max_document_size:
+                if on_skipped is not None:
+                    on_skipped(len(buffer) - position)
+                buffer, position, eof = _skip_document(text_stream, buffer, position, chunk_size)
+                continue
+            # The object is cut off at the chunk boundary; keep the tail and read more
+            more = text_stream.read(chunk_size)
+            eof = not more
+            buffer = buffer[position:] + more
+            position = 0
+            continue
+        if end == len(buffer) and not eof and not isinstance(document, (dict, list)):
+            # A number or literal at the very end might continue in the next chunk
+            more = text_stream.read(chunk_size)
+            if more:
+                buffer = buffer[position:] + more
+                position = 0
+                continue
+            eof = True
+        position = end
+        yield document
+
+
+def convert_timestamp(value):
+    if isinstance(value, dict) and "$date" in value:
+        value = value["$date"]
+        if isinstance(value, dict) and "$numberLong" in value:
+            value = int(value["$numberLong"])
+    if isinstance(value, (int, float)):
+        return EPOCH + timedelta(milliseconds=value)
+    if isinstance(value, str):
+        if value.endswith("Z"):
+            value = value[:-1]
+        return datetime.fromisoformat(value.replace(" ", "T").replace(",", "."))
+    raise ValueError(f"Unsupported timestamp: {value!r}")
+
+
+def to_import_doc(document):
+    if "meta" in document:
+        document = from_storage_doc(dict(document))
+    document["timestamp"] = convert_timestamp(document["timestamp"])
+    return to_storage_doc(document)
+
+
+def import_logs(collection, path, batch_size=IMPORT_BATCH_SIZE, max_document_size=MAX_DOCUMENT_SIZE):
+    started = time.monotonic()
+    imported = 0
+    skipped = 0
+    batch = []
+
+    binary = open_binary(path)
+    encoding = detect_encoding(binary.peek(4)[:4])
+    text = io.TextIOWrapper(binary, encoding=encoding, newline="")
+    print(f"Importing {path} ({encoding})")
+
+    def flush():
+        nonlocal imported, batch
+        if batch:
+            collection.insert_many(batch, ordered=False)
+            imported += len(batch)
+            batch = []
+            elapsed = time.monotonic() - started
+            print(f"  {imported} logs, {imported / elapsed:,.0f} logs/s")
+
+    def report_skipped(size):
+        nonlocal skipped
+        skipped += 1
+        print(f"  skipping a malformed document ({size:,} characters buffered, limit --max-document-size)")
+
+    for document in iter_json_documents(text, max_document_size=max_document_size, on_skipped=report_skipped):
+        try:
+            batch.append(to_import_doc(document))
+        except (KeyError, ValueError, TypeError):
+            skipped += 1
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    text.close()
+
+    elapsed = time.monotonic() - started
+    print(f"Imported {imported} logs in {elapsed:.2f}s ({imported / max(elapsed, 1e-9):,.0f} logs/s), skipped {skipped}")
+    return imported
+
+
+def export_logs(collection, path, start, end, level=None, app_name=None):
+    started = time.monotonic()
+    query = {"timestamp": {"$gte": start, "$lt": end}}
+    if level:
+        query["meta.level"] = level
+    if app_name:
+        query["meta.app_name"] = app_name
+
+    if path == "-":
+        out = sys.stdout
+    elif path.endswith(".gz"):
+        out = gzip.open(path, "wt", encoding="utf-8")
+    else:
+        out = open(path, "w", encoding="utf-8")
+
+    exported = 0
+    cursor = collection.find(query, {"_id": 0}, batch_size=IMPORT_BATCH_SIZE).sort("timestamp", ASCENDING)
+    for log in cursor:
+        log = from_storage_doc(log)
+        log["timestamp"] = log["timestamp"].isoformat()
+        out.write(json.dumps(log, ensure_ascii=False))
+        out.write("\n")
+        exported += 1
+    if out is not sys.stdout:
+        out.close()
+
+    elapsed = time.monotonic() - started
+    print(f"Exported {exported} logs in {elapsed:.2f}s ({exported / max(elapsed, 1e-9):,.0f} logs/s)", file=sys.stderr)
+    return exported
+
+
+def parse_date(value):
+    return datetime.fromisoformat(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import/export log dumps")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="load a JSON array or NDJSON dump into Mongo")
+    import_parser.add_argument("path", help="dump file, '-' for stdin")
+    import_parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    import_parser.add_argument("--max-document-size", type=int, default=MAX_DOCUMENT_SIZE,
+                               help="characters one document may span before it is skipped")
+
+    export_parser = subparsers.add_parser("export", help="write logs in a date range as (gzip) NDJSON")
+    export_parser.add_argument("path", help="output file (.gz for gzip), '-' for stdout")
+    export_parser.add_argument("--from", dest="start", type=parse_date, required=True, help="YYYY-MM-DD or ISO datetime")
+    export_parser.add_argument("--to", dest="end", type=parse_date, required=True, help="exclusive, YYYY-MM-DD or ISO datetime")
+    export_parser.add_argument("--level")
+    export_parser.add_argument("--app-name")
+
+    args = parser.parse_args()
+
+    client = MongoClient(MONGODB_URL)
+    db = client["logging_db"]
+
+    if args.command == "import":
+        collection = ensure_log_collection(db)
+        import_logs(collection, args.path, batch_size=args.batch_size, max_document_size=args.max_document_size)
+    else:
+        export_logs(db["logs"], args.path, args.start, args.end, level=args.level, app_name=args.app_name)
+
+
+if __name__ == "__main__":
+    main()
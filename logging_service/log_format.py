@@ -0,0 +1,76 @@
+import json
+import re
+from datetime import datetime, timedelta
+
+# Version 1 envelope, published by the Python producers as application/json:
+# {"v": 1, "ts": <epoch ms>, "level": ..., "url": ..., "correlation_id": ...,
+#  "app_name": ..., "message": ..., "suppressed": <n, optional>}
+# where "suppressed" counts similar logs the producer's sampler dropped before this one
+ENVELOPE_VERSION = 1
+SUPPORTED_VERSIONS = {1}
+
+EPOCH = datetime(1970, 1, 1)
+
+# Legacy "<timestamp> <level> <url> Correlation: <id> [<app>] - <message>" lines,
+# still sent by the Node services and by producers that predate the envelope
+LEGACY_PATTERN = re.compile(
+    r'(\d{4})-(\d{2})-(\d{2}) (\d{2}):(\d{2}):(\d{2}),(\d{3}) (\w+) (.+?) Correlation: (\S*) \[(.+?)\] - (.*)',
+    re.DOTALL
+)
+
+
+def parse_envelope(envelope: dict):
+    if envelope.get("v") not in SUPPORTED_VERSIONS:
+        raise ValueError(f"Unsupported log envelope version: {envelope.get('v')}")
+    return {
+        "timestamp": EPOCH + timedelta(milliseconds=int(envelope["ts"])),
+        "level": str(envelope.get("level") or "UNKNOWN"),
+        "url": str(envelope.get("url") or ""),
+        "correlation_id": str(envelope.get("correlation_id") or ""),
+        "app_name": str(envelope.get("app_name") or ""),
+        "message": str(envelope.get("message") or ""),
+        "suppressed": int(envelope.get("suppressed") or 0)
+    }
+
+
+def parse_legacy_message(log_message: str):
+    match = LEGACY_PATTERN.match(log_message)
+    if match:
+        year, month, day, hour, minute, second, millis, level, url, correlation_id, app_name, message = match.groups()
+        timestamp = datetime(int(year), int(month), int(day), int(hour), int(minute), int(second), int(millis) * 1000)
+        return {
+            "timestamp": timestamp,
+            "level": level,
+            "url": url,
+            "correlation_id": correlation_id,
+            "app_name": app_name,
+            "message": message
+        }
+    else:
+        return {
+            "timestamp": datetime.utcnow(),
+            "level": "UNKNOWN",
+            "url": "",
+            "correlation_id": "",
+            "app_name": "",
+            "message": log_message
+        }
+
+
+def parse_log_message(log_message: str):
+    if log_message.startswith("{"):
+        try:
+            return parse_envelope(json.loads(log_message))
+        except (ValueError, KeyError, TypeError, OverflowError):
+            pass
+    return parse_legacy_message(log_message)
+
+
+def parse_log_body(body: bytes):
+    # Fast path: structured envelopes skip decoding to str and the regex entirely
+    if body[:1] == b"{":
+        try:
+            return parse_envelope(json.loads(body))
+        except (ValueError, KeyError, TypeError, OverflowError):
+            pass
+    return parse_legacy_message(body.decode('utf-8', errors='replace'))
@@ -1,11 +1,20 @@
-from fastapi import FastAPI, HTTPException
-from pymongo import MongoClient
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from pymongo import MongoClient, ASCENDING
 from pydantic import BaseModel
-from typing import List
-from datetime import datetime
+from typing import List, Optional
+from datetime import datetime, timedelta
+from bson import ObjectId
+from bson.errors import InvalidId
+import base64
+import binascii
+import json
 import pika
 import os
-import re
+
+from consumer import LogConsumer
+from log_format import parse_log_body
+from storage import ensure_log_collection, to_storage_doc, from_storage_doc
 
 MONGODB_URL = os.getenv('MONGODB_URL', 'mongodb://logging-mongo:27017/logging_db')
 RABBITMQ_HOST = os.getenv('RABBITMQ_HOST', 'rabbitmq')
@@ -14,6 +23,14 @@ RABBITMQ_USER = os.getenv('RABBITMQ_USER', 'admin')
 RABBITMQ_PASS = os.getenv('RABBITMQ_PASS', 'secret')
 EXCHANGE_NAME = 'logging_exchange'
 QUEUE_NAME = 'logging_queue'
+LOG_CONSUMER_ENABLED = os.getenv('LOG_CONSUMER_ENABLED', 'true').lower() == 'true'
+MANUAL_DRAIN_BATCH_SIZE = int(os.getenv('MANUAL_DRAIN_BATCH_SIZE', 1000))
+LOG_QUERY_MAX_LIMIT = int(os.getenv('LOG_QUERY_MAX_LIMIT', 10000))
+LOG_QUERY_BATCH_SIZE = int(os.getenv('LOG_QUERY_BATCH_SIZE', 1000))
+TRACE_MAX_ENTRIES = int(os.getenv('TRACE_MAX_ENTRIES', 5000))
+SLOWEST_TRACES_MAX_LIMIT = int(os.getenv('SLOWEST_TRACES_MAX_LIMIT', 1000))
+# Correlation ids that are placeholders rather than a real request
+IGNORED_CORRELATION_IDS = ["", "unknown"]
 
 mongo_client = None
 logs_collection = None
@@ -33,6 +50,17 @@ def init_database():
 
 db_initialized = init_database()
 
+# _id is part of every index so keyset pagination on (timestamp, _id) never needs an in-memory sort
+LOG_INDEXES = [
+    ([("timestamp", ASCENDING), ("_id", ASCENDING)], "timestamp_id"),
+    ([("meta.app_name", ASCENDING), ("meta.level", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)], "app_name_level_timestamp_id"),
+    ([("correlation_id", ASCENDING), ("timestamp", ASCENDING)], "correlation_id_timestamp"),
+]
+
+def ensure_indexes():
+    for keys, name in LOG_INDEXES:
+        logs_collection.create_index(keys, name=name)
+
 def get_rabbitmq_connection():
     credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASS)
     connection = pika.BlockingConnection(pika.ConnectionParameters(
@@ -42,30 +70,6 @@ def get_rabbitmq_connection():
     ))
     return connection
 
-def parse_log_message(log_message: str):
-    pattern = r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) (\w+) (.+?) Correlation: ([a-f0-9-]+) \[(.+?)\] - (.+)'
-    match = re.match(pattern, log_message)
-    if match:
-        timestamp_str, level, url, correlation_id, app_name, message = match.groups()
-        timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S,%f')
-        return {
-            "timestamp": timestamp,
-            "level": level,
-            "url": url,
-            "correlation_id": correlation_id,
-            "app_name": app_name,
-            "message": message
-        }
-    else:
-        return {
-            "timestamp": datetime.utcnow(),
-            "level": "UNKNOWN",
-            "url": "",
-            "correlation_id": "",
-            "app_name": "",
-            "message": log_message
-        }
-
 class LogEntry(BaseModel):
     timestamp: str
     level: str
@@ -76,8 +80,47 @@ class LogEntry(BaseModel):
 
 app = FastAPI(title="Logging Service")
 
+log_consumer = None
+
+def parse_log_document(body: bytes):
+    return to_storage_doc(parse_log_body(body))
+
+@app.on_event("startup")
+def prepare_log_storage():
+    if logs_collection is None:
+        return
+    try:
+        ensure_log_collection(mongo_client["logging_db"])
+        ensure_indexes()
+    except Exception as e:
+        print(f"Error preparing log storage: {e}")
+
+@app.on_event("startup")
+def start_log_consumer():
+    global log_consumer
+    if not LOG_CONSUMER_ENABLED or logs_collection is None:
+        return
+    log_consumer = LogConsumer(
+        connection_factory=get_rabbitmq_connection,
+        collection=logs_collection,
+        parse=parse_log_document,
+        queue_name=QUEUE_NAME
+    )
+    log_consumer.start()
+
+@app.on_event("shutdown")
+def stop_log_consumer():
+    if log_consumer is not None:
+        log_consumer.stop()
+
+@app.get("/logs/consumer")
+async def get_consumer_stats():
+    if log_consumer is None:
+        return {"running": False}
+    return log_consumer.stats()
+
 @app.post("/logs")
-async def consume_logs():
+def consume_logs():
     if mongo_client is None or logs_collection is None:
         raise HTTPException(status_code=503, detail="Database not available")
 
@@ -87,21 +130,22 @@ async def consume_logs():
         # ensure queue/exchange exist before consuming
         channel.exchange_declare(exchange=EXCHANGE_NAME, exchange_type='direct', durable=True)
         channel.queue_declare(queue=QUEUE_NAME, durable=True)
-        channel.bind_queue = getattr(channel, 'bind_queue', None)
         logs_consumed = 0
         while True:
-            method_frame, header_frame, body = channel.basic_get(queue=QUEUE_NAME, auto_ack=True)
-            if method_frame:
-                log_message = body.decode('utf-8')
-                print(f"Raw log message: '{log_message}'")
-
-                # Parse the log message into structured data
-                log_data = parse_log_message(log_message)
-                logs_collection.insert_one(log_data)
-                logs_consumed += 1
-                print(f"Stored parsed log: {log_data}")
-            else:
+            batch = []
+            last_tag = None
+            while len(batch) < MANUAL_DRAIN_BATCH_SIZE:
+                method_frame, header_frame, body = channel.basic_get(queue=QUEUE_NAME, auto_ack=False)
+                if not method_frame:
+                    break
+                batch.append(parse_log_document(body))
+                last_tag = method_frame.delivery_tag
+            if not batch:
                 break
+            # Ack only after the batch is stored so nothing is lost if the insert fails
+            logs_collection.insert_many(batch, ordered=False)
+            channel.basic_ack(delivery_tag=last_tag, multiple=True)
+            logs_consumed += len(batch)
 
         connection.close()
         return {"message": f"Consumed {logs_consumed} logs"}
@@ -109,30 +153,227 @@ async def consume_logs():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error consuming logs: {str(e)}")
 
+def encode_cursor(log):
+    raw = f"{log['timestamp'].isoformat()}|{log['_id']}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        timestamp_str, log_id = raw.split("|", 1)
+        return datetime.fromisoformat(timestamp_str), ObjectId(log_id)
+    except (ValueError, InvalidId, binascii.Error, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def build_logs_query(start_date, end_date, level=None, app_name=None, url=None, cursor=None):
+    query = {"timestamp": {"$gte": start_date, "$lt": end_date}}
+    if app_name:
+        query["meta.app_name"] = app_name
+    if level:
+        query["meta.level"] = level
+    if url:
+        query["url"] = url
+    if cursor:
+        last_timestamp, last_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"timestamp": {"$gt": last_timestamp}},
+            {"timestamp": last_timestamp, "_id": {"$gt": last_id}}
+        ]
+    return query
+
+def serialize_log(log):
+    from_storage_doc(log)
+    log.pop("_id", None)
+    log['timestamp'] = log['timestamp'].isoformat()
+    return log
+
+def stream_logs_ndjson(logs):
+    for log in logs:
+        yield json.dumps(serialize_log(log), ensure_ascii=False) + "\n"
+
 @app.get("/logs/{datumOd}/{datumDo}", response_model=List[LogEntry])
-async def get_logs(datumOd: str, datumDo: str):
+def get_logs(
+    datumOd: str,
+    datumDo: str,
+    response: Response,
+    level: Optional[str] = None,
+    app_name: Optional[str] = None,
+    url: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    stream: bool = False
+):
+    """
+    Logs in [datumOd, datumDo], oldest first.
+
+    With `limit`, returns one page and puts the cursor for the next page in the
+    X-Next-Cursor header. With `stream=true`, writes NDJSON as Mongo yields documents.
+    """
     if mongo_client is None or logs_collection is None:
         raise HTTPException(status_code=503, detail="Database not available")
 
     try:
         start_date = datetime.strptime(datumOd, '%Y-%m-%d')
-        end_date = datetime.strptime(datumDo, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
+        end_date = datetime.strptime(datumDo, '%Y-%m-%d') + timedelta(days=1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+
+    if limit is not None and not 0 < limit <= LOG_QUERY_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {LOG_QUERY_MAX_LIMIT}")
+
+    query = build_logs_query(start_date, end_date, level, app_name, url, cursor)
+
+    try:
+        logs = logs_collection.find(query, batch_size=LOG_QUERY_BATCH_SIZE).sort([("timestamp", ASCENDING), ("_id", ASCENDING)])
+        if limit is not None:
+            logs = logs.limit(limit)
 
-        logs = list(logs_collection.find({
-            "timestamp": {
-                "$gte": start_date,
-                "$lte": end_date
-            }
-        }, {"_id": 0}).sort("timestamp", 1))
+        if stream:
+            return StreamingResponse(stream_logs_ndjson(logs), media_type="application/x-ndjson")
 
-        for log in logs:
-            log['timestamp'] = log['timestamp'].isoformat()
+        logs = list(logs)
+        if limit is not None and len(logs) == limit:
+            response.headers["X-Next-Cursor"] = encode_cursor(logs[-1])
 
-        return logs
+        return [serialize_log(log) for log in logs]
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving logs: {str(e)}")
 
+def milliseconds_between(start, end):
+    return round((end - start).total_seconds() * 1000, 3)
+
+def build_trace(correlation_id, logs):
+    """
+    Orders a request's logs across services and splits them into hops, i.e. runs of
+    consecutive entries from the same app_name, with offsets relative to the first entry.
+    """
+    start = logs[0]["timestamp"]
+    entries = []
+    hops = []
+    previous = None
+    for log in logs:
+        timestamp = log["timestamp"]
+        entry = {
+            "timestamp": timestamp.isoformat(),
+            "offset_ms": milliseconds_between(start, timestamp),
+            "gap_ms": milliseconds_between(previous["timestamp"], timestamp) if previous else 0.0,
+            "level": log["level"],
+            "app_name": log["app_name"],
+            "url": log["url"],
+            "message": log["message"]
+        }
+        entries.append(entry)
+
+        if not hops or hops[-1]["app_name"] != log["app_name"]:
+            hops.append({
+                "app_name": log["app_name"],
+                "start_offset_ms": entry["offset_ms"],
+                "end_offset_ms": entry["offset_ms"],
+                "gap_before_ms": entry["gap_ms"],
+                "entries": 1
+            })
+        else:
+            hops[-1]["end_offset_ms"] = entry["offset_ms"]
+            hops[-1]["entries"] += 1
+        previous = log
+
+    # A hop lasts until the next hop starts; the last one ends at its last entry
+    for current, following in zip(hops, hops[1:]):
+        current["duration_ms"] = round(following["start_offset_ms"] - current["start_offset_ms"], 3)
+    hops[-1]["duration_ms"] = round(hops[-1]["end_offset_ms"] - hops[-1]["start_offset_ms"], 3)
+
+    return {
+        "correlation_id": correlation_id,
+        "start": start.isoformat(),
+        "end": logs[-1]["timestamp"].isoformat(),
+        "duration_ms": milliseconds_between(start, logs[-1]["timestamp"]),
+        "apps": sorted({log["app_name"] for log in logs}),
+        "slowest_hop": max(hops, key=lambda hop: hop["duration_ms"])["app_name"],
+        "hops": hops,
+        "entries": entries
+    }
+
+def parse_window_bound(value: str, end=False):
+    try:
+        if len(value) == 10:
+            bound = datetime.strptime(value, '%Y-%m-%d')
+            return bound + timedelta(days=1) if end else bound
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date or datetime: {value}")
+
+@app.get("/traces/slowest")
+def get_slowest_traces(datumOd: str, datumDo: str, limit: int = 20, app_name: Optional[str] = None):
+    """
+    Slowest request traces (first to last log of a correlation id) logged in the window.
+    Dates are YYYY-MM-DD (whole days) or ISO datetimes.
+    """
+    if mongo_client is None or logs_collection is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    if not 0 < limit <= SLOWEST_TRACES_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {SLOWEST_TRACES_MAX_LIMIT}")
+
+    start = parse_window_bound(datumOd)
+    end = parse_window_bound(datumDo, end=True)
+    match = {
+        "timestamp": {"$gte": start, "$lt": end},
+        "correlation_id": {"$nin": IGNORED_CORRELATION_IDS}
+    }
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": "$correlation_id",
+            "start": {"$min": "$timestamp"},
+            "end": {"$max": "$timestamp"},
+            "entries": {"$sum": 1},
+            "apps": {"$addToSet": "$meta.app_name"}
+        }},
+        {"$project": {
+            "_id": 0,
+            "correlation_id": "$_id",
+            "start": 1,
+            "end": 1,
+            "entries": 1,
+            "apps": 1,
+            "duration_ms": {"$subtract": ["$end", "$start"]}
+        }},
+        {"$sort": {"duration_ms": -1}},
+        {"$limit": limit}
+    ]
+    if app_name:
+        pipeline.insert(3, {"$match": {"apps": app_name}})
+
+    try:
+        traces = list(logs_collection.aggregate(pipeline, allowDiskUse=True))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving traces: {str(e)}")
+
+    for trace in traces:
+        trace["start"] = trace["start"].isoformat()
+        trace["end"] = trace["end"].isoformat()
+        trace["apps"] = sorted(trace["apps"])
+    return traces
+
+@app.get("/traces/{correlation_id}")
+def get_trace(correlation_id: str):
+    """Timeline of one request across services, ordered by time."""
+    if mongo_client is None or logs_collection is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+
+    try:
+        logs = list(
+            logs_collection.find({"correlation_id": correlation_id})
+            .sort([("timestamp", ASCENDING), ("_id", ASCENDING)])
+            .limit(TRACE_MAX_ENTRIES)
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving trace: {str(e)}")
+
+    if not logs:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return build_trace(correlation_id, [from_storage_doc(log) for log in logs])
+
 @app.delete("/logs")
 async def delete_logs():
     if mongo_client is None or logs_collection is None:
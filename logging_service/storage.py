@@ -0,0 +1,220 @@
+"""
+Log storage in a MongoDB time-series collection.
+
+Documents are stored as
+    {"timestamp": ..., "meta": {"app_name": ..., "level": ...}, "url": ..., "correlation_id": ..., "message": ...}
+so Mongo buckets them per (app_name, level). Sampled producers also set an optional
+"suppressed" count of similar logs they dropped before this one. Retention is handled by Mongo itself:
+the collection expires ERROR logs after LOG_ERROR_RETENTION_DAYS and a partial TTL
+index expires every other level after LOG_RETENTION_DAYS (needs MongoDB 6.3+).
+
+Migrating an existing plain `logs` collection:
+    python storage.py migrate [--batch-size 5000] [--drop-source]
+
+The copy records its progress in `log_migrations`, so a migration interrupted by a crash or
+restart is resumed on the next start (or by `migrate`) instead of being left half done.
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+
+from pymongo import MongoClient
+
+LOGS_COLLECTION = 'logs'
+LOG_RETENTION_DAYS = int(os.getenv('LOG_RETENTION_DAYS', 14))
+LOG_ERROR_RETENTION_DAYS = int(os.getenv('LOG_ERROR_RETENTION_DAYS', 90))
+LOG_TIMESERIES_GRANULARITY = os.getenv('LOG_TIMESERIES_GRANULARITY', 'seconds')
+# Partial index filters cannot use $ne, so the short-lived levels are listed explicitly
+LOG_SHORT_RETENTION_LEVELS = [
+    level.strip() for level in os.getenv('LOG_SHORT_RETENTION_LEVELS', 'DEBUG,INFO,WARNING,WARN,UNKNOWN').split(',')
+    if level.strip()
+]
+LOG_MIGRATE_ON_STARTUP = os.getenv('LOG_MIGRATE_ON_STARTUP', 'true').lower() == 'true'
+MIGRATION_BATCH_SIZE = int(os.getenv('LOG_MIGRATION_BATCH_SIZE', 5000))
+
+SHORT_RETENTION_INDEX = 'timestamp_short_retention_ttl'
+MIGRATIONS_COLLECTION = 'log_migrations'
+DAY_SECONDS = 24 * 60 * 60
+
+
+def to_storage_doc(log):
+    doc = {
+        "timestamp": log["timestamp"],
+        "meta": {"app_name": log.get("app_name", ""), "level": log.get("level", "UNKNOWN")},
+        "url": log.get("url", ""),
+        "correlation_id": log.get("correlation_id", ""),
+        "message": log.get("message", "")
+    }
+    # Only sampled producers set it, so unsampled logs stay as small as before
+    if log.get("suppressed"):
+        doc["suppressed"] = log["suppressed"]
+    return doc
+
+
+def from_storage_doc(doc):
+    meta = doc.pop("meta", None) or {}
+    doc["level"] = meta.get("level", "UNKNOWN")
+    doc["app_name"] = meta.get("app_name", "")
+    return doc
+
+
+def collection_type(db, name):
+    info = list(db.list_collections(filter={"name": name}))
+    return info[0].get("type") if info else None
+
+
+def create_timeseries_collection(db, name):
+    db.create_collection(
+        name,
+        timeseries={"timeField": "timestamp", "metaField": "meta", "granularity": LOG_TIMESERIES_GRANULARITY},
+        expireAfterSeconds=LOG_ERROR_RETENTION_DAYS * DAY_SECONDS
+    )
+    print(f"Created time-series collection '{name}'")
+
+
+def ensure_retention(db, name=LOGS_COLLECTION):
+    """Bring the collection and partial TTL index in line with the configured retention."""
+    error_ttl = LOG_ERROR_RETENTION_DAYS * DAY_SECONDS
+    short_ttl = min(LOG_RETENTION_DAYS, LOG_ERROR_RETENTION_DAYS) * DAY_SECONDS
+
+    info = list(db.list_collections(filter={"name": name}))[0]
+    if info.get("options", {}).get("expireAfterSeconds") != error_ttl:
+        db.command("collMod", name, expireAfterSeconds=error_ttl)
+
+    collection = db[name]
+    existing = collection.index_information().get(SHORT_RETENTION_INDEX)
+    if existing is None:
+        collection.create_index(
+            [("timestamp", 1)],
+            name=SHORT_RETENTION_INDEX,
+            expireAfterSeconds=short_ttl,
+            partialFilterExpression={"meta.level": {"$in": LOG_SHORT_RETENTION_LEVELS}}
+        )
+    elif existing.get("expireAfterSeconds") != short_ttl:
+        db.command("collMod", name, index={"name": SHORT_RETENTION_INDEX, "expireAfterSeconds": short_ttl})
+
+
+def migrate_legacy_collection(db, source, target=LOGS_COLLECTION, batch_size=MIGRATION_BATCH_SIZE):
+    """
+    Copy plain log documents into the time-series collection in _id order.
+
+    After every batch the last copied _id is saved in `log_migrations`, and copied documents
+    keep their legacy _id. A rerun continues after the saved _id and skips documents of an
+    interrupted batch that already reached `target` (time-series collections do not enforce
+    unique _ids, so they are checked explicitly).
+    """
+    progress = db[MIGRATIONS_COLLECTION]
+    state = progress.find_one({"_id": source}) or {}
+    last_id = state.get("last_id")
+    copied = state.get("copied", 0)
+    if last_id is not None:
+        print(f"Resuming migration of '{source}' after {copied} logs")
+    started = time.monotonic()
+    # Only the batch in flight when a previous run stopped can be partly copied
+    check_existing = True
+    batch = []
+    batch_last_id = last_id
+
+    def flush():
+        nonlocal batch, copied, check_existing
+        docs = batch
+        if docs and check_existing:
+            present = {doc["_id"] for doc in db[target].find({"_id": {"$in": [d["_id"] for d in docs]}}, {"_id": 1})}
+            docs = [doc for doc in docs if doc["_id"] not in present]
+            check_existing = False
+        if docs:
+            db[target].insert_many(docs, ordered=False)
+        copied += len(batch)
+        progress.update_one({"_id": source}, {"$set": {"last_id": batch_last_id, "copied": copied}}, upsert=True)
+        batch = []
+
+    query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+    for doc in db[source].find(query).sort("_id", 1).batch_size(batch_size):
+        batch_last_id = doc["_id"]
+        if not isinstance(doc.get("timestamp"), datetime):
+            continue
+        storage_doc = to_storage_doc(doc)
+        storage_doc["_id"] = doc["_id"]
+        batch.append(storage_doc)
+        if len(batch) >= batch_size:
+            flush()
+            print(f"Migrated {copied} logs ({copied / (time.monotonic() - started):.0f}/s)")
+    flush()
+    progress.update_one({"_id": source}, {"$set": {"done": True, "finished": datetime.utcnow()}})
+    print(f"Migrated {copied} logs from '{source}' to '{target}' in {time.monotonic() - started:.1f}s")
+    return copied
+
+
+def convert_legacy_collection(db, batch_size=MIGRATION_BATCH_SIZE, drop_source=False):
+    """Rename the plain `logs` collection to `logs_legacy_<date>` and copy it into a new time-series one."""
+    legacy = f"{LOGS_COLLECTION}_legacy_{datetime.utcnow():%Y%m%d%H%M%S}"
+    # Recorded before the rename, so a crash at any later point leaves a migration to resume
+    db[MIGRATIONS_COLLECTION].insert_one({"_id": legacy, "copied": 0, "done": False, "started": datetime.utcnow()})
+    db[LOGS_COLLECTION].rename(legacy)
+    create_timeseries_collection(db, LOGS_COLLECTION)
+    migrate_legacy_collection(db, legacy, batch_size=batch_size)
+    if drop_source:
+        db.drop_collection(legacy)
+        print(f"Dropped '{legacy}'")
+    return legacy
+
+
+def resume_migrations(db, batch_size=MIGRATION_BATCH_SIZE):
+    """Finish migrations that a previous run started but did not complete."""
+    resumed = []
+    for state in db[MIGRATIONS_COLLECTION].find({"done": False}):
+        source = state["_id"]
+        if collection_type(db, source) is None:
+            # Stopped before the rename: `logs` was left as it was and is converted again
+            db[MIGRATIONS_COLLECTION].delete_one({"_id": source})
+            continue
+        if collection_type(db, LOGS_COLLECTION) is None:
+            create_timeseries_collection(db, LOGS_COLLECTION)
+        migrate_legacy_collection(db, source, batch_size=batch_size)
+        resumed.append(source)
+    return resumed
+
+
+def ensure_log_collection(db, migrate=LOG_MIGRATE_ON_STARTUP):
+    """Make sure `logs` is a time-series collection with the configured retention."""
+    if migrate:
+        resume_migrations(db)
+    elif db[MIGRATIONS_COLLECTION].find_one({"done": False}):
+        print("An interrupted log migration is pending; run `python storage.py migrate` to finish it")
+    kind = collection_type(db, LOGS_COLLECTION)
+    if kind == "collection":
+        if not migrate:
+            raise RuntimeError(f"'{LOGS_COLLECTION}' is not a time-series collection; run `python storage.py migrate`")
+        convert_legacy_collection(db)
+    elif kind is None:
+        create_timeseries_collection(db, LOGS_COLLECTION)
+    ensure_retention(db)
+    return db[LOGS_COLLECTION]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Logging service storage maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subparsers.add_parser("migrate", help="convert the plain logs collection to time-series")
+    migrate_parser.add_argument("--batch-size", type=int, default=MIGRATION_BATCH_SIZE)
+    migrate_parser.add_argument("--drop-source", action="store_true", help="drop the legacy collection afterwards")
+    args = parser.parse_args()
+
+    client = MongoClient(os.getenv('MONGODB_URL', 'mongodb://logging-mongo:27017/logging_db'))
+    db = client["logging_db"]
+
+    if args.command == "migrate":
+        for source in resume_migrations(db, batch_size=args.batch_size):
+            if args.drop_source:
+                db.drop_collection(source)
+                print(f"Dropped '{source}'")
+        if collection_type(db, LOGS_COLLECTION) == "collection":
+            convert_legacy_collection(db, batch_size=args.batch_size, drop_source=args.drop_source)
+        else:
+            print(f"'{LOGS_COLLECTION}' is already a time-series collection, nothing to migrate")
+        ensure_log_collection(db, migrate=False)
+
+
+if __name__ == "__main__":
+    main()
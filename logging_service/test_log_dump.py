@@ -0,0 +1,46 @@
+import io
+
+import pytest
+
+from log_dump import import_logs, iter_json_documents
+
+NDJSON = '{"a":1}\n{"b": oops}\n{"c":3}\n'
+NDJSON_BAD_LAST = '{"a":1}\n{"c":3}\n{"b": oops}\n'
+ARRAY = '[\n{"a":1},\n{"b": oops},\n{"c":3}\n]'
+ARRAY_BAD_LAST = '[\n{"a":1},\n{"c":3},\n{"b": oops}\n]'
+
+
+@pytest.mark.parametrize("text", [NDJSON, NDJSON_BAD_LAST, ARRAY, ARRAY_BAD_LAST])
+@pytest.mark.parametrize("chunk_size", [3, 1 << 20])
+def test_malformed_record_is_skipped(text, chunk_size):
+    skipped = []
+    documents = list(iter_json_documents(io.StringIO(text), chunk_size=chunk_size, on_skipped=skipped.append))
+    assert documents == [{"a": 1}, {"c": 3}]
+    assert len(skipped) == 1
+
+
+def test_oversized_record_is_skipped():
+    text = '{"a":1}\n{"big": "' + "x" * 5000 + '"}\n{"c":3}\n'
+    skipped = []
+    documents = list(iter_json_documents(io.StringIO(text), chunk_size=64, max_document_size=1000,
+                                         on_skipped=skipped.append))
+    assert documents == [{"a": 1}, {"c": 3}]
+    assert len(skipped) == 1
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = []
+
+    def insert_many(self, docs, ordered=True):
+        self.docs.extend(docs)
+
+
+def test_import_keeps_batch_before_malformed_last_record(tmp_path):
+    path = tmp_path / "dump.ndjson"
+    path.write_text('{"timestamp": "2026-01-01T00:00:00", "message": "a"}\n'
+                    '{"timestamp": "2026-01-01T00:00:01", "message": "b"}\n'
+                    '{"timestamp": "2026-01-01T00:00:02", "message": oops}\n')
+    collection = FakeCollection()
+    assert import_logs(collection, str(path)) == 2
+    assert [doc["message"] for doc in collection.docs] == ["a", "b"]
@@ -0,0 +1,244 @@
+"""
+Odjemalec za statistika_service, skupen vsem storitvam. Docker slike ga kopirajo v /shared
+in ga dodajo v PYTHONPATH; lokalno storitev zaženemo s PYTHONPATH=../shared.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+import requests
+from fastapi.routing import APIRoute
+from starlette.routing import Match
+
+STATISTIKA_URL = os.getenv("STATISTIKA_URL", "http://statistika_service:8000/statistika")
+STATISTIKA_BATCH_URL = os.getenv("STATISTIKA_BATCH_URL", STATISTIKA_URL.rstrip("/") + "/batch")
+STATISTIKA_QUEUE_MAXSIZE = int(os.getenv("STATISTIKA_QUEUE_MAXSIZE", 10000))
+STATISTIKA_BATCH_SIZE = int(os.getenv("STATISTIKA_BATCH_SIZE", 500))
+STATISTIKA_FLUSH_INTERVAL = float(os.getenv("STATISTIKA_FLUSH_INTERVAL", 1.0))
+STATISTIKA_RETRY_MAX_DELAY = float(os.getenv("STATISTIKA_RETRY_MAX_DELAY", 30))
+
+
+class StatistikaBuffer:
+    """
+    Medpomnilnik za statistiko klicev: `dodaj` klic le doda v omejeno asyncio vrsto,
+    opravilo v ozadju pa jih v paketih pošlje na POST /statistika/batch preko ene
+    requests.Session (ponovna uporaba povezav). HTTP klic teče v niti, da ne blokira
+    zanke dogodkov. Ko statistika_service ni dosegljiv ali vrne 5xx, paket obdržimo in
+    poskusimo znova z naraščajočim zamikom; paket, ki ga zavrne s 4xx, zavržemo, saj bi
+    ponovni poskusi le ustavili vse nadaljnje pošiljanje. Ko je vrsta polna, se novi
+    klici zavržejo.
+    """
+
+    def __init__(self, url=STATISTIKA_BATCH_URL, maxsize=STATISTIKA_QUEUE_MAXSIZE,
+                 batch_size=STATISTIKA_BATCH_SIZE, flush_interval=STATISTIKA_FLUSH_INTERVAL,
+                 retry_max_delay=STATISTIKA_RETRY_MAX_DELAY):
+        self.url = url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_max_delay = retry_max_delay
+
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self._pending = []
+        self._task = None
+        self._closing = False
+        self._session = None
+
+        self.sent = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.failures = 0
+
+    def dodaj(self, endpoint: str, trajanje_ms: float = None, status: int = None, klicatelj: str = None) -> bool:
+        klic = {"klicanaStoritev": endpoint, "cas": datetime.utcnow().isoformat()}
+        if trajanje_ms is not None and status is not None:
+            klic["trajanjeMs"] = round(trajanje_ms, 3)
+            klic["status"] = status
+        if klicatelj:
+            klic["klicatelj"] = klicatelj
+        try:
+            self._queue.put_nowait(klic)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._session = requests.Session()
+            self._task = asyncio.create_task(self._run(), name="statistika-buffer")
+
+    async def stop(self, timeout=5.0):
+        """Poskusi poslati še preostale klice in zapre sejo."""
+        self._closing = True
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+            self._task = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize() + len(self._pending),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "failures": self.failures,
+        }
+
+    async def _collect_batch(self):
+        # Počakamo do flush_interval, da se nabere cel paket, namesto da pošiljamo po en klic
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(self._pending) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0 or self._closing and self._queue.empty():
+                break
+            try:
+                self._pending.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    def _post(self, batch):
+        response = self._session.post(self.url, json={"klici": batch}, timeout=5)
+        response.raise_for_status()
+
+    @staticmethod
+    def _retryable(error):
+        """Povezave, časovne omejitve, 5xx ter 408/429 poskusimo znova; ostale 4xx ne."""
+        if isinstance(error, requests.HTTPError) and error.response is not None:
+            status = error.response.status_code
+            return status >= 500 or status in (408, 429)
+        return True
+
+    async def _run(self):
+        retry_delay = 0.5
+        while not (self._closing and not self._pending and self._queue.empty()):
+            await self._collect_batch()
+            if not self._pending:
+                continue
+            batch = self._pending[:self.batch_size]
+            try:
+                await asyncio.to_thread(self._post, batch)
+            except Exception as e:
+                self.failures += 1
+                if not self._retryable(e):
+                    del self._pending[:len(batch)]
+                    self.rejected += len(batch)
+                    print(f"Statistika zavrnila paket, zavrženih {len(batch)} klicev "
+                          f"(skupaj {self.rejected}): {e}")
+                    continue
+                print(f"Napaka pri pošiljanju statistike: {e}")
+                if self._closing:
+                    self.dropped += len(self._pending)
+                    self._pending = []
+                    break
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, self.retry_max_delay)
+                continue
+            del self._pending[:len(batch)]
+            self.sent += len(batch)
+            retry_delay = 0.5
+
+
+statistika_buffer = StatistikaBuffer()
+
+
+UNMATCHED_ROUTE = "(unmatched)"
+
+
+def route_template(scope):
+    """
+    Vrne "<METODA> <predloga poti>" (npr. "GET /veselice/{veselica_id}") za route, ki je
+    obdelal zahtevek. Zahtevki brez popolnega ujemanja z API routom (404, pa tudi 405, ko se
+    ujema le pot) se štejejo skupaj kot "<METODA> (unmatched)"; poti izven API-ja (docs,
+    openapi.json) vrnejo None.
+    """
+    route = scope.get("route")
+    if route is not None:
+        # Router zapiše route tudi pri delnem ujemanju (napačna metoda)
+        match, _ = route.matches(scope)
+        if match != Match.FULL:
+            route = None
+    else:
+        # Starejši FastAPI ne zapiše route v scope, zato ga poiščemo sami
+        for candidate in scope["app"].router.routes:
+            match, _ = candidate.matches(scope)
+            if match == Match.FULL:
+                route = candidate
+                break
+    if route is None:
+        return f"{scope['method']} {UNMATCHED_ROUTE}"
+    if not isinstance(route, APIRoute):
+        return None
+    return f"{scope['method']} {route.path}"
+
+
+def _jwt_subject(authorization):
+    # Le za statistiko: podpisa ne preverjamo, to naredi storitev sama
+    try:
+        payload = authorization.split(" ", 1)[1].split(".")[1]
+        return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))).get("sub")
+    except (IndexError, ValueError, AttributeError):
+        return None
+
+
+def caller_identity(scope):
+    """
+    Psevdonimna identiteta klicatelja za štetje različnih uporabnikov: user_id, ki ga
+    nastavi avtentikacija, sicer "sub" iz Bearer tokena, sicer IP naslov. Pošljemo le hash.
+    """
+    identity = scope.get("state", {}).get("user_id")
+    if not identity:
+        for name, value in scope.get("headers", []):
+            if name == b"authorization" and value.startswith(b"Bearer "):
+                identity = _jwt_subject(value.decode("latin-1"))
+                break
+    if not identity and scope.get("client"):
+        identity = f"ip:{scope['client'][0]}"
+    if not identity:
+        return None
+    return hashlib.blake2b(str(identity).encode("utf-8"), digest_size=8).hexdigest()
+
+
+class StatistikaMiddleware:
+    """
+    ASGI middleware, ki vsak zahtevek na API route zabeleži v statistiko pod predlogo
+    poti in metodo, namesto dejanske poti z ID-ji, skupaj s trajanjem (do konca odgovora),
+    statusno kodo in hashom klicatelja. Buffer zažene ob prvem zahtevku.
+    """
+
+    def __init__(self, app, buffer=None):
+        self.app = app
+        self.buffer = buffer or statistika_buffer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        await self.buffer.start()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            trajanje_ms = (time.perf_counter() - started) * 1000
+            # Router route zapiše v isti scope, zato je po obdelavi na voljo tudi tukaj
+            template = route_template(scope)
+            if template is not None:
+                self.buffer.dodaj(template, trajanje_ms, status, caller_identity(scope))
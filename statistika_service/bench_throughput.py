@@ -0,0 +1,92 @@
+"""
+Prepustnost statistika_service (zahtevki/s in p50/p99) za vnos in branje.
+
+Zahteva httpx (pip install httpx) in zagnano storitev, npr. s SQLite namesto Postgresa:
+
+    DATABASE_URL=sqlite:////tmp/statistika_bench.db uvicorn main:app --port 8000
+    python bench_throughput.py --url http://localhost:8000 -c 50 -n 5000
+
+Za primerjavo poola z DB_POOL_SIZE/DB_MAX_OVERFLOW storitev zaženemo z različnimi
+vrednostmi in primerjamo izpis (--label).
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+
+ENDPOINTS = ["POST /uporabnik/prijava", "GET /uporabnik/prijavljen", "GET /veselice", "GET /veselice/{veselica_id}"]
+
+
+def ingest_single(client):
+    return client.post("/statistika", json={
+        "klicanaStoritev": random.choice(ENDPOINTS),
+        "trajanjeMs": random.lognormvariate(3, 0.7),
+        "status": 200
+    })
+
+
+def ingest_batch(client, size):
+    return client.post("/statistika/batch", json={"klici": [
+        {"klicanaStoritev": random.choice(ENDPOINTS), "trajanjeMs": random.lognormvariate(3, 0.7), "status": 200}
+        for _ in range(size)
+    ]})
+
+
+SCENARIOS = {
+    "ingest": ingest_single,
+    "batch": lambda client: ingest_batch(client, 200),
+    "stevilo": lambda client: client.get("/statistika/stevilo"),
+    "najpogostejsi": lambda client: client.get("/statistika/najpogostejsi"),
+}
+
+
+async def run_scenario(client, name, concurrency, requests):
+    latencies = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            response = await SCENARIOS[name](client)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"  {name:<14} {len(latencies) / elapsed:8.1f} zahtevkov/s, "
+          f"p50 {latencies[len(latencies) // 2] * 1000:7.1f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:7.1f} ms, "
+          f"povprečje {statistics.fmean(latencies) * 1000:7.1f} ms, {errors} napak")
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=60, limits=limits) as client:
+        print(f"{args.label}: {args.concurrency} hkrati, {args.requests} zahtevkov na scenarij")
+        for name in args.scenarios:
+            requests = args.requests // 20 if name == "batch" else args.requests
+            await run_scenario(client, name, args.concurrency, max(requests, 1))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("-c", "--concurrency", type=int, default=50)
+    parser.add_argument("-n", "--requests", type=int, default=5000)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--label", default="statistika")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
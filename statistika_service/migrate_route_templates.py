@@ -0,0 +1,103 @@
+"""
+Enkratna migracija: stare zapise v endpoint_calls z dejanskimi potmi (npr. "/veselice/6650f1...")
+prepiše v predloge route z metodo (npr. "GET /veselice/{veselica_id}"), kot jih zdaj
+beleži StatistikaMiddleware, in na novo zgradi rollupe.
+
+    python migrate_route_templates.py [--dry-run]
+
+Stari odjemalec metode ni pošiljal. Kjer je ista pot služila več metodam
+(/veselice: GET in POST, /veselice/{id}: GET in DELETE), metode ni mogoče ugotoviti,
+zato dobijo metodo "*".
+
+Ure pred raw_window_start (surovi klici so že odstranjeni z retencijo) so le v
+endpoint_hourly, zato te vrstice prestavimo na predlogo in jih združimo s obstoječimi;
+ostale ure in endpoint_totals rebuild_rollups zgradi na novo.
+"""
+import argparse
+import re
+
+from sqlalchemy import delete, select, union, update
+
+from database import SessionLocal, EndpointCall, EndpointHourly
+from rollups import rebuild_rollups, _upsert_counts
+
+# Poti, ki jih je storitev_uporabniskega_sistema ročno pošiljala s poslji_statistiko
+LEGACY_ROUTES = [
+    (re.compile(r"^/uporabnik/registracija$"), "POST /uporabnik/registracija"),
+    (re.compile(r"^/uporabnik/prijava$"), "POST /uporabnik/prijava"),
+    (re.compile(r"^/auth/refresh$"), "POST /auth/refresh"),
+    (re.compile(r"^/uporabnik/odjava$"), "POST /uporabnik/odjava"),
+    (re.compile(r"^/uporabnik/prijavljen$"), "GET /uporabnik/prijavljen"),
+    (re.compile(r"^/uporabniki$"), "GET /uporabniki"),
+    (re.compile(r"^/uporabnik/posodobi-uporabnika$"), "PUT /uporabnik/posodobi-uporabnika"),
+    (re.compile(r"^/uporabnik/posodobi-uporabnika/spremeni-geslo$"), "PATCH /uporabnik/posodobi-uporabnika/spremeni-geslo"),
+    (re.compile(r"^/uporabnik/izbrisi-racun$"), "DELETE /uporabnik/izbrisi-racun"),
+    (re.compile(r"^/uporabnik/izbrisi-racun/[^/]+$"), "DELETE /uporabnik/izbrisi-racun/{uporabnisko_ime}"),
+    (re.compile(r"^/veselice$"), "* /veselice"),
+    (re.compile(r"^/veselice/[^/]+/prijava$"), "POST /veselice/{veselica_id}/prijava"),
+    (re.compile(r"^/veselice/[^/]+/odjava$"), "POST /veselice/{veselica_id}/odjava"),
+    (re.compile(r"^/veselice/[^/]+$"), "* /veselice/{veselica_id}"),
+    (re.compile(r"^/auth/verify-token$"), "POST /auth/verify-token"),
+]
+
+
+def template_for(endpoint):
+    for pattern, template in LEGACY_ROUTES:
+        if pattern.match(endpoint):
+            return template
+    return None
+
+
+def rekey_hourly(db, endpoint, template):
+    """Urne rollupe poti `endpoint` prišteje k predlogi `template` in jih odstrani."""
+    counts = {
+        (template, hour): count for hour, count in db.execute(
+            select(EndpointHourly.hour, EndpointHourly.count).where(EndpointHourly.endpoint == endpoint)
+        )
+    }
+    if counts:
+        _upsert_counts(db, EndpointHourly, ["endpoint", "hour"], counts)
+        db.execute(delete(EndpointHourly).where(EndpointHourly.endpoint == endpoint))
+
+
+def migrate(db, dry_run=False):
+    endpoints = db.execute(union(
+        select(EndpointCall.endpoint), select(EndpointHourly.endpoint)
+    )).scalars().all()
+    rewritten = 0
+    unknown = []
+    for endpoint in endpoints:
+        if endpoint is None or " " in endpoint:
+            # Že predloga z metodo
+            continue
+        template = template_for(endpoint)
+        if template is None:
+            unknown.append(endpoint)
+            continue
+        if not dry_run:
+            result = db.execute(update(EndpointCall).where(EndpointCall.endpoint == endpoint).values(endpoint=template))
+            rekey_hourly(db, endpoint, template)
+            db.commit()
+            rewritten += result.rowcount
+        print(f"{endpoint} -> {template}")
+    if unknown:
+        print(f"Neznane poti (ostanejo nespremenjene): {', '.join(sorted(unknown))}")
+    if not dry_run:
+        rebuild_rollups(db)
+        print(f"Prepisanih {rewritten} klicev, rollupi so na novo zgrajeni.")
+    return rewritten
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prepis starih poti v predloge route")
+    parser.add_argument("--dry-run", action="store_true", help="le izpiši preslikave")
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        migrate(db, dry_run=args.dry_run)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Neobvezno dnevno particioniranje endpoint_calls po called_at (PostgreSQL, STATISTIKA_PARTITIONING=true).
+
+Particije se imenujejo endpoint_calls_pYYYYMMDD in pokrivajo [dan, dan + 1); klici brez
+ustrezne particije pristanejo v endpoint_calls_default. Retencija stare particije
+odstrani z DROP TABLE namesto brisanja vrstic.
+"""
+import os
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+PARTITIONING = os.getenv("STATISTIKA_PARTITIONING", "false").lower() == "true"
+PARTITION_DAYS_AHEAD = int(os.getenv("STATISTIKA_PARTITION_DAYS_AHEAD", 7))
+
+TABLE = "endpoint_calls"
+DEFAULT_PARTITION = f"{TABLE}_default"
+_PARTITION_NAME = re.compile(rf"^{TABLE}_p(\d{{8}})$")
+
+
+def partitioning_enabled(connection):
+    return PARTITIONING and connection.dialect.name == "postgresql"
+
+
+def is_partitioned(connection):
+    kind = connection.execute(text("SELECT relkind FROM pg_class WHERE relname = :name"), {"name": TABLE}).scalar()
+    return kind == "p"
+
+
+def table_exists(connection):
+    return connection.execute(text("SELECT to_regclass(:name)"), {"name": TABLE}).scalar() is not None
+
+
+def create_partitioned_table(connection):
+    """Ustvari particionirano endpoint_calls; primarni ključ mora vsebovati ključ particije."""
+    connection.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {TABLE} (
+            id BIGSERIAL,
+            endpoint VARCHAR,
+            called_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+            PRIMARY KEY (id, called_at)
+        ) PARTITION BY RANGE (called_at)
+    """))
+    connection.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"))
+
+
+def partition_name(day):
+    return f"{TABLE}_p{day:%Y%m%d}"
+
+
+def ensure_partitions(connection, start=None, end=None):
+    """Ustvari dnevne particije od `start` (privzeto včeraj) do PARTITION_DAYS_AHEAD dni naprej."""
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    day = (start or today - timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    end = end or today + timedelta(days=PARTITION_DAYS_AHEAD)
+    while day <= end:
+        connection.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(day)} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{day:%Y-%m-%d}') TO ('{day + timedelta(days=1):%Y-%m-%d}')"
+        ))
+        day += timedelta(days=1)
+
+
+def list_partitions(connection):
+    """[(ime, začetek dneva), ...] dnevnih particij, urejeno po času."""
+    names = connection.execute(text("""
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = :name
+    """), {"name": TABLE}).scalars().all()
+    partitions = []
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            partitions.append((name, datetime.strptime(match.group(1), "%Y%m%d")))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def drop_partitions_before(connection, cutoff):
+    """Odstrani particije, ki v celoti ležijo pred `cutoff`. Vrne imena odstranjenih."""
+    dropped = []
+    for name, day in list_partitions(connection):
+        if day + timedelta(days=1) > cutoff:
+            break
+        connection.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+        connection.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+    return dropped
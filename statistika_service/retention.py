@@ -0,0 +1,237 @@
+"""
+Retencija surovih klicev v endpoint_calls.
+
+Surove klice hranimo STATISTIKA_RAW_RETENTION_DAYS dni. Starejše ure najprej z enim
+GROUP BY uskladimo z urnimi rollupi (endpoint_hourly, endpoint_totals), ki se sicer
+vzdržujejo že ob vnosu, in mejo usklajenih ur shranimo (rollups.COMPACTED_BEFORE); vsaka
+ura se uskladi le enkrat, pozne klice pred mejo pa vnos prišteje le v rollupe. Nato surove
+vrstice brišemo v paketih po STATISTIKA_RETENTION_BATCH_SIZE z commitom po
+vsakem paketu, da posel nikoli ne drži dolgih zaklepov. S particioniranjem (partitions.py)
+cele stare dni odstranimo z DROP TABLE. Bralni endpointi starejše obdobje berejo iz rollupov.
+
+    python retention.py run [--dry-run]
+    python retention.py partition [--batch-size 50000] [--drop-source]
+
+Storitev posel poganja tudi sama vsakih STATISTIKA_RETENTION_INTERVAL_SECONDS (0 = izklopljeno).
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select, text
+
+import partitions
+from database import engine, SessionLocal, create_schema, EndpointCall, EndpointHourly, EndpointTotal
+from rollups import (hour_of, raw_window_start, time_bucket, compacted_before, set_compacted_before,
+                     _upsert_counts)
+
+RAW_RETENTION_DAYS = int(os.getenv("STATISTIKA_RAW_RETENTION_DAYS", 30))
+RETENTION_BATCH_SIZE = int(os.getenv("STATISTIKA_RETENTION_BATCH_SIZE", 5000))
+RETENTION_INTERVAL_SECONDS = int(os.getenv("STATISTIKA_RETENTION_INTERVAL_SECONDS", 3600))
+# Več workerjev lahko hkrati sproži retencijo; na PostgreSQL jo izvede le eden
+ADVISORY_LOCK_ID = 4_812_001
+
+
+def retention_cutoff(now=None):
+    return hour_of((now or datetime.utcnow()) - timedelta(days=RAW_RETENTION_DAYS))
+
+
+def compact_window(db, start, cutoff):
+    """
+    Uskladi urne rollupe s surovimi klici v [start, cutoff) (surovi klici so vir resnice).
+    Ure pred compacted_before so že usklajene in njihovih surovih klicev ni več, zato jih
+    klicatelj ne sme vključiti. Commit opravi klicatelj.
+    """
+    hour = time_bucket(EndpointCall.called_at, "hour", db.get_bind().dialect.name).label("hour")
+    raw = {}
+    for endpoint, bucket, count in db.execute(
+        select(EndpointCall.endpoint, hour, func.count())
+        .where(EndpointCall.called_at >= start, EndpointCall.called_at < cutoff)
+        .group_by(EndpointCall.endpoint, hour)
+    ):
+        # SQLite vrne začetek ure kot niz
+        raw[(endpoint, datetime.fromisoformat(bucket) if isinstance(bucket, str) else bucket)] = count
+    if not raw:
+        return 0
+    existing = {
+        (endpoint, bucket): count for endpoint, bucket, count in db.execute(
+            select(EndpointHourly.endpoint, EndpointHourly.hour, EndpointHourly.count)
+            .where(EndpointHourly.hour >= start, EndpointHourly.hour < cutoff)
+        )
+    }
+    deltas = {key: count - existing.get(key, 0) for key, count in raw.items()}
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if deltas:
+        totals = {}
+        for (endpoint, _), delta in deltas.items():
+            totals[(endpoint,)] = totals.get((endpoint,), 0) + delta
+        _upsert_counts(db, EndpointHourly, ["endpoint", "hour"], deltas)
+        _upsert_counts(db, EndpointTotal, ["endpoint"], totals)
+    return sum(deltas.values())
+
+
+def delete_raw_before(db, cutoff, batch_size=RETENTION_BATCH_SIZE):
+    """Briše surove klice pred `cutoff` v paketih po id, s commitom po vsakem paketu."""
+    deleted = 0
+    while True:
+        ids = db.execute(
+            select(EndpointCall.id).where(EndpointCall.called_at < cutoff).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return deleted
+        db.execute(delete(EndpointCall).where(EndpointCall.id.in_(ids), EndpointCall.called_at < cutoff))
+        db.commit()
+        deleted += len(ids)
+
+
+def _try_lock(db):
+    """
+    Vrne (zaklenjeno, povezava). Zaklep je vezan na sejo PostgreSQL, posel pa vmes
+    commita in vrača povezave v bazen, zato zaklep vzamemo in sprostimo na namenski
+    povezavi, ki jo držimo ves posel.
+    """
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql":
+        return True, None
+    connection = bind.connect()
+    try:
+        locked = connection.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": ADVISORY_LOCK_ID}).scalar()
+        connection.commit()
+    except Exception:
+        connection.close()
+        raise
+    if not locked:
+        connection.close()
+        return False, None
+    return True, connection
+
+
+def _unlock(connection):
+    if connection is None:
+        return
+    try:
+        connection.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": ADVISORY_LOCK_ID})
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def run_retention(db, now=None, dry_run=False, batch_size=RETENTION_BATCH_SIZE):
+    """Izvede retencijo in vrne število odstranjenih surovih klicev."""
+    locked, lock_connection = _try_lock(db)
+    if not locked:
+        print("Retencija že teče v drugem procesu.")
+        return 0
+    try:
+        started = time.monotonic()
+        cutoff = retention_cutoff(now)
+        watermark = compacted_before(db)
+        start = raw_window_start(db)
+        connection = db.connection()
+        partitioned = partitions.partitioning_enabled(connection) and partitions.is_partitioned(connection)
+        if partitioned:
+            partitions.ensure_partitions(connection)
+            db.commit()
+        if db.execute(select(EndpointCall.id).where(EndpointCall.called_at < cutoff).limit(1)).first() is None:
+            return 0
+        if dry_run:
+            count = db.execute(select(func.count()).select_from(EndpointCall).where(EndpointCall.called_at < cutoff)).scalar()
+            print(f"Odstranili bi {count} klicev pred {cutoff:%Y-%m-%d %H:%M}")
+            return 0
+
+        corrected = compact_window(db, start, cutoff) if start is not None and start < cutoff else 0
+        # Meja se ne premakne nazaj, tudi če se STATISTIKA_RAW_RETENTION_DAYS poveča
+        set_compacted_before(db, max(cutoff, watermark) if watermark is not None else cutoff)
+        db.commit()
+        if corrected:
+            print(f"Rollupi popravljeni za {corrected} klicev")
+
+        deleted = 0
+        if partitioned:
+            for name in partitions.drop_partitions_before(db.connection(), cutoff):
+                print(f"Odstranjena particija {name}")
+            db.commit()
+        deleted += delete_raw_before(db, cutoff, batch_size)
+        print(f"Retencija: surovi klici pred {cutoff:%Y-%m-%d %H:%M}, odstranjenih {deleted} vrstic "
+              f"(brez odstranjenih particij) v {time.monotonic() - started:.1f}s")
+        return deleted
+    finally:
+        _unlock(lock_connection)
+
+
+def convert_to_partitioned(batch_size=50000, drop_source=False):
+    """Pretvori navadno endpoint_calls v particionirano: preimenuje, ustvari novo in prepiše po paketih."""
+    legacy = f"{partitions.TABLE}_legacy_{datetime.utcnow():%Y%m%d%H%M%S}"
+    with engine.begin() as connection:
+        if partitions.is_partitioned(connection):
+            print("endpoint_calls je že particionirana.")
+            return
+        connection.execute(text(f"ALTER TABLE {partitions.TABLE} RENAME TO {legacy}"))
+        connection.execute(text(f"ALTER TABLE {legacy} RENAME CONSTRAINT {partitions.TABLE}_pkey TO {legacy}_pkey"))
+        # Imena indeksov so globalna; preimenujemo jih, da jih create_schema ustvari na novi tabeli
+        for index in EndpointCall.__table__.indexes:
+            connection.execute(text(f"ALTER INDEX IF EXISTS {index.name} RENAME TO {index.name}_legacy"))
+        oldest = connection.execute(text(f"SELECT min(called_at) FROM {legacy}")).scalar()
+        partitions.create_partitioned_table(connection)
+        partitions.ensure_partitions(connection, start=oldest)
+        create_schema(connection)
+
+    copied = 0
+    last_id = 0
+    started = time.monotonic()
+    while True:
+        with engine.begin() as connection:
+            last = connection.execute(text(f"""
+                WITH batch AS (
+                    INSERT INTO {partitions.TABLE} (id, endpoint, called_at)
+                    SELECT id, endpoint, called_at FROM {legacy}
+                    WHERE id > :last_id AND called_at IS NOT NULL ORDER BY id LIMIT :batch_size
+                    RETURNING id
+                )
+                SELECT max(id), count(*) FROM batch
+            """), {"last_id": last_id, "batch_size": batch_size}).one()
+        if not last[1]:
+            break
+        last_id = last[0]
+        copied += last[1]
+        print(f"Prepisanih {copied} klicev ({copied / (time.monotonic() - started):.0f}/s)")
+
+    with engine.begin() as connection:
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{partitions.TABLE}', 'id'), "
+            f"(SELECT coalesce(max(id), 1) FROM {partitions.TABLE}))"
+        ))
+        if drop_source:
+            connection.execute(text(f"DROP TABLE {legacy}"))
+            print(f"Odstranjena {legacy}")
+    print(f"endpoint_calls je particionirana, prepisanih {copied} klicev.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retencija surovih klicev statistike")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="uskladi rollupe in odstrani stare surove klice")
+    run_parser.add_argument("--dry-run", action="store_true")
+    run_parser.add_argument("--batch-size", type=int, default=RETENTION_BATCH_SIZE)
+    partition_parser = subparsers.add_parser("partition", help="PostgreSQL: pretvori endpoint_calls v dnevne particije")
+    partition_parser.add_argument("--batch-size", type=int, default=50000)
+    partition_parser.add_argument("--drop-source", action="store_true", help="po prepisu odstrani staro tabelo")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        with engine.begin() as connection:
+            create_schema(connection)
+        db = SessionLocal()
+        try:
+            run_retention(db, dry_run=args.dry_run, batch_size=args.batch_size)
+        finally:
+            db.close()
+    else:
+        if engine.dialect.name != "postgresql":
+            raise SystemExit("Particioniranje je na voljo le za PostgreSQL.")
+        convert_to_partitioned(batch_size=args.batch_size, drop_source=args.drop_source)
+
+
+if __name__ == "__main__":
+    main()
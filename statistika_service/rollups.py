@@ -0,0 +1,292 @@
+"""
+Rollup tabele za statistiko: skupno število klicev na endpoint (endpoint_totals),
+število klicev po urah (endpoint_hourly), sketchi latenc po intervalih
+LATENCY_BUCKET_MINUTES (endpoint_latency) in HyperLogLog različnih klicateljev po
+urah (endpoint_unique_callers). Vzdržujejo se ob vnosu v isti transakciji
+kot endpoint_calls, zato bralni endpointi ne delajo GROUP BY čez vse klice.
+
+Ponovna izgradnja iz endpoint_calls (npr. po ročnem uvozu podatkov):
+    python rollups.py rebuild
+"""
+import argparse
+import os
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import func, select, delete, insert, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database import (engine, SessionLocal, create_schema, EndpointCall, EndpointTotal, EndpointHourly,
+                      EndpointLatency, EndpointUniqueCallers, StatistikaState)
+from sketches import LatencySketch, HyperLogLog
+
+LATENCY_BUCKET_MINUTES = int(os.getenv("STATISTIKA_LATENCY_BUCKET_MINUTES", 5))
+# Ure pred to mejo je retencija že uskladila in njihove surove klice odstranila
+COMPACTED_BEFORE = "raw_compacted_before"
+
+_UPSERT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def hour_of(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+_SQLITE_BUCKET_FORMATS = {
+    "minute": "%Y-%m-%d %H:%M:00.000000",
+    "hour": "%Y-%m-%d %H:00:00.000000",
+    "day": "%Y-%m-%d 00:00:00.000000",
+}
+
+
+def time_bucket(column, bucket, dialect_name):
+    """SQL izraz, ki čas zaokroži navzdol na začetek minute, ure ali dneva."""
+    if dialect_name == "postgresql":
+        return func.date_trunc(bucket, column)
+    if dialect_name == "sqlite":
+        return func.strftime(_SQLITE_BUCKET_FORMATS[bucket], column)
+    raise RuntimeError(f"Rollupi ne podpirajo baze '{dialect_name}'")
+
+
+def latency_bucket_of(value):
+    return value.replace(minute=value.minute - value.minute % LATENCY_BUCKET_MINUTES, second=0, microsecond=0)
+
+
+def status_class(status):
+    return f"{status // 100}xx"
+
+
+def _dialect_insert(db):
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name not in _UPSERT_INSERTS:
+        raise RuntimeError(f"Rollupi ne podpirajo baze '{dialect_name}'")
+    return _UPSERT_INSERTS[dialect_name]
+
+
+def _upsert_counts(db, model, key_columns, counts):
+    # Urejeni ključi: sočasne transakcije zaklepajo vrstice v enakem vrstnem redu (brez deadlockov)
+    rows = [dict(zip(key_columns, key), count=count) for key, count in sorted(counts.items())]
+    statement = _dialect_insert(db)(model).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={"count": model.count + statement.excluded.count}
+    )
+    db.execute(statement)
+
+
+def record_calls(db, calls):
+    """Prišteje klice [(endpoint, called_at), ...] v rollupe. Commit opravi klicatelj."""
+    if not calls:
+        return
+    totals = Counter()
+    hourly = Counter()
+    for endpoint, called_at in calls:
+        totals[(endpoint,)] += 1
+        hourly[(endpoint, hour_of(called_at))] += 1
+    _upsert_counts(db, EndpointTotal, ["endpoint"], totals)
+    _upsert_counts(db, EndpointHourly, ["endpoint", "hour"], hourly)
+
+
+def _locked_rows(db, model, key_columns, keys, defaults):
+    """
+    Vrne zaklenjene (FOR UPDATE) vrstice za ključe, manjkajoče pa prej ustvari z `defaults`
+    (ON CONFLICT DO NOTHING). Sketche nato združimo v Pythonu, ne da bi se sočasni vnosi prepisali.
+    """
+    keys = sorted(keys)
+    db.execute(_dialect_insert(db)(model).values([
+        dict(zip(key_columns, key), **defaults) for key in keys
+    ]).on_conflict_do_nothing(index_elements=key_columns))
+    columns = [getattr(model, name) for name in key_columns]
+    return db.execute(
+        select(model).where(tuple_(*columns).in_(keys)).order_by(*columns).with_for_update()
+    ).scalars().all()
+
+
+def record_latencies(db, samples):
+    """Prišteje latence [(endpoint, called_at, trajanje_ms, status), ...] v sketche. Commit opravi klicatelj."""
+    sketches = {}
+    for endpoint, called_at, duration_ms, status in samples:
+        key = (endpoint, latency_bucket_of(called_at), status_class(status))
+        sketches.setdefault(key, LatencySketch()).add(duration_ms)
+    if not sketches:
+        return
+    rows = _locked_rows(db, EndpointLatency, ["endpoint", "bucket", "status_class"], sketches,
+                        {"count": 0, "sketch": LatencySketch().to_dict()})
+    for row in rows:
+        merged = LatencySketch.from_dict(row.sketch)
+        merged.merge(sketches[(row.endpoint, row.bucket, row.status_class)])
+        row.sketch = merged.to_dict()
+        row.count = merged.count
+
+
+def record_callers(db, samples):
+    """Doda klicatelje [(endpoint, called_at, klicatelj), ...] v HyperLogLog po urah. Commit opravi klicatelj."""
+    sketches = {}
+    for endpoint, called_at, caller in samples:
+        sketches.setdefault((endpoint, hour_of(called_at)), HyperLogLog()).add(caller)
+    if not sketches:
+        return
+    rows = _locked_rows(db, EndpointUniqueCallers, ["endpoint", "hour"], sketches,
+                        {"registers": HyperLogLog().to_bytes()})
+    for row in rows:
+        merged = HyperLogLog.from_bytes(row.registers)
+        merged.merge(sketches[(row.endpoint, row.hour)])
+        row.registers = merged.to_bytes()
+
+
+def latency_sketches(db, od, do, endpoint=None, status=None):
+    """Združi sketche intervalov z začetkom v [od, do) v en sketch na endpoint."""
+    query = select(EndpointLatency.endpoint, EndpointLatency.sketch).where(
+        EndpointLatency.bucket >= od, EndpointLatency.bucket < do)
+    if endpoint:
+        query = query.where(EndpointLatency.endpoint == endpoint)
+    if status:
+        query = query.where(EndpointLatency.status_class == status)
+    merged = {}
+    for row_endpoint, sketch in db.execute(query):
+        sketch = LatencySketch.from_dict(sketch)
+        if row_endpoint in merged:
+            merged[row_endpoint].merge(sketch)
+        else:
+            merged[row_endpoint] = sketch
+    return merged
+
+
+def unique_callers(db, od, do, endpoint=None):
+    """
+    Združi HyperLogLog ur z začetkom v [od, do). Vrne (HLL na endpoint, HLL vseh endpointov),
+    saj se unija različnih klicateljev ne da sešteti iz ocen posameznih endpointov.
+    """
+    query = select(EndpointUniqueCallers.endpoint, EndpointUniqueCallers.registers).where(
+        EndpointUniqueCallers.hour >= od, EndpointUniqueCallers.hour < do)
+    if endpoint:
+        query = query.where(EndpointUniqueCallers.endpoint == endpoint)
+    merged = {}
+    total = HyperLogLog()
+    for row_endpoint, registers in db.execute(query):
+        sketch = HyperLogLog.from_bytes(registers)
+        total.merge(sketch)
+        if row_endpoint in merged:
+            merged[row_endpoint].merge(sketch)
+        else:
+            merged[row_endpoint] = sketch
+    return merged, total
+
+
+def rebuild_rollups(db):
+    """
+    Urne rollupe na novo izračuna iz endpoint_calls z INSERT ... SELECT ... GROUP BY. Ure pred
+    raw_window_start (surovi klici so že odstranjeni) ostanejo; skupne vsote so vsota vseh ur.
+    """
+    raw_start = raw_window_start(db)
+    hour = time_bucket(EndpointCall.called_at, "hour", db.get_bind().dialect.name)
+    if raw_start is not None:
+        db.execute(delete(EndpointHourly).where(EndpointHourly.hour >= raw_start))
+        db.execute(insert(EndpointHourly).from_select(
+            ["endpoint", "hour", "count"],
+            select(EndpointCall.endpoint, hour, func.count())
+            .where(EndpointCall.called_at >= raw_start)
+            .group_by(EndpointCall.endpoint, hour)
+        ))
+    db.execute(delete(EndpointTotal))
+    db.execute(insert(EndpointTotal).from_select(
+        ["endpoint", "count"],
+        select(EndpointHourly.endpoint, func.sum(EndpointHourly.count)).group_by(EndpointHourly.endpoint)
+    ))
+    db.commit()
+
+
+def compacted_before(db):
+    """Meja, pred katero so ure že uskladila retencija (le v rollupih), ali None."""
+    return db.execute(select(StatistikaState.value).where(StatistikaState.name == COMPACTED_BEFORE)).scalar()
+
+
+def set_compacted_before(db, value):
+    statement = _dialect_insert(db)(StatistikaState).values(name=COMPACTED_BEFORE, value=value)
+    db.execute(statement.on_conflict_do_update(index_elements=["name"], set_={"value": statement.excluded.value}))
+
+
+def raw_window_start(db):
+    """
+    Začetek ure najstarejšega surovega klica, a ne pred compacted_before. Retencija briše le
+    cele ure, zato so surovi klici od te ure naprej popolni, starejše pa pokrivajo le rollupi.
+    None, če klicev ni.
+    """
+    bound = compacted_before(db)
+    query = select(func.min(EndpointCall.called_at))
+    if bound is not None:
+        query = query.where(EndpointCall.called_at >= bound)
+    oldest = db.execute(query).scalar()
+    if isinstance(oldest, str):
+        oldest = datetime.fromisoformat(oldest)
+    return hour_of(oldest) if oldest is not None else None
+
+
+def _bucket_counts(db, model, time_column, value, bucket, od, do, endpoint):
+    start = time_bucket(time_column, bucket, db.get_bind().dialect.name).label("start")
+    query = select(start, value).where(time_column >= od, time_column < do)
+    if endpoint:
+        query = query.where(model.endpoint == endpoint)
+    rows = db.execute(query.group_by(start)).all()
+    # SQLite vrne začetek predalčka kot niz
+    return Counter({
+        datetime.fromisoformat(start) if isinstance(start, str) else start: int(count)
+        for start, count in rows
+    })
+
+
+def histogram(db, od, do, bucket, endpoint=None):
+    """
+    Število klicev v [od, do) po časovnih predalčkih. Ure in dneve beremo iz endpoint_hourly,
+    kadar sta meji poravnani na uro; sicer (in za minute) štejemo v endpoint_calls preko
+    indeksa (endpoint, called_at). Del okna pred raw_window_start (surovi klici so že
+    odstranjeni z retencijo) beremo iz endpoint_hourly, z natančnostjo ene ure.
+    Vrne (vir, [(začetek predalčka, število), ...]).
+    """
+    raw_start = raw_window_start(db)
+    hourly = (EndpointHourly, EndpointHourly.hour, func.sum(EndpointHourly.count))
+    raw = (EndpointCall, EndpointCall.called_at, func.count())
+
+    if bucket != "minute" and od == hour_of(od) and do == hour_of(do):
+        source, counts = "rollup", _bucket_counts(db, *hourly, bucket, od, do, endpoint)
+    elif raw_start is not None and od >= raw_start:
+        source, counts = "endpoint_calls", _bucket_counts(db, *raw, bucket, od, do, endpoint)
+    elif raw_start is None or do <= raw_start:
+        source, counts = "rollup", _bucket_counts(db, *hourly, bucket, hour_of(od), do, endpoint)
+    else:
+        source = "rollup+endpoint_calls"
+        counts = _bucket_counts(db, *hourly, bucket, hour_of(od), raw_start, endpoint)
+        counts.update(_bucket_counts(db, *raw, bucket, raw_start, do, endpoint))
+    return source, sorted(counts.items())
+
+
+def ensure_rollups(db):
+    """Ob prvem zagonu z obstoječimi podatki rollupe napolni iz endpoint_calls."""
+    has_totals = db.execute(select(EndpointTotal.endpoint).limit(1)).first() is not None
+    has_calls = db.execute(select(EndpointCall.id).limit(1)).first() is not None
+    if has_calls and not has_totals:
+        print("Gradim rollupe iz endpoint_calls ...")
+        rebuild_rollups(db)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vzdrževanje rollup tabel statistike")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("rebuild", help="na novo izračunaj rollupe iz endpoint_calls")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        with engine.begin() as connection:
+            create_schema(connection)
+        db = SessionLocal()
+        try:
+            rebuild_rollups(db)
+        finally:
+            db.close()
+        print("Rollupi so na novo zgrajeni.")
+
+
+if __name__ == "__main__":
+    main()
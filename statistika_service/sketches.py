@@ -0,0 +1,135 @@
+"""
+Združljivi (mergeable) sketchi za statistiko.
+
+LatencySketch je sketch latenc z relativno natančnostjo, po zgledu DDSketch.
+
+Vrednost v se prišteje v predalček ceil(log_gamma(v)), gamma = (1 + a) / (1 - a); vsak
+kvantil je tako znotraj relativne napake `a` (privzeto 1 %) od prave vrednosti. Dva
+sketcha z enako natančnostjo združimo s seštevanjem predalčkov, zato lahko poljubno
+okno izračunamo iz shranjenih sketchev po časovnih intervalih. Za latence od 0,1 ms
+do ure je predalčkov največ nekaj sto, ne glede na število klicev.
+"""
+import hashlib
+import math
+
+RELATIVE_ACCURACY = 0.01
+# Vrednosti pod to mejo (v ms) štejemo v ničelni predalček
+MIN_VALUE = 0.001
+
+
+class LatencySketch:
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zero = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value, count=1):
+        if value <= MIN_VALUE:
+            self.zero += count
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.count += count
+        self.sum += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Združimo lahko le sketche z enako natančnostjo")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zero += other.zero
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                # Sredina predalčka (gamma^(i-1), gamma^i] z relativno napako največ `a`
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "a": self.relative_accuracy,
+            "b": {str(index): count for index, count in self.bins.items()},
+            "z": self.zero,
+            "n": self.count,
+            "s": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data.get("a", RELATIVE_ACCURACY))
+        sketch.bins = {int(index): count for index, count in data.get("b", {}).items()}
+        sketch.zero = data.get("z", 0)
+        sketch.count = data.get("n", 0)
+        sketch.sum = data.get("s", 0.0)
+        if sketch.count:
+            sketch.min = data["min"]
+            sketch.max = data["max"]
+        return sketch
+
+
+class HyperLogLog:
+    """
+    HyperLogLog za oceno števila različnih klicateljev. Pri natančnosti p ima 2^p
+    enobajtnih registrov (p=12: 4 KB, standardna napaka ~1,6 %) ne glede na promet.
+    Dva HLL z enakim p združimo z maksimumom po registrih.
+    """
+
+    def __init__(self, precision=12, registers=None):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+        if len(self.registers) != self.m:
+            raise ValueError("Število registrov se ne ujema z natančnostjo")
+
+    def add(self, value):
+        # Stabilen 64-bitni hash (vgrajeni hash() je v vsakem procesu drugačen)
+        h = int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Združimo lahko le HLL z enako natančnostjo")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        raw = alpha * self.m * self.m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * self.m and zeros:
+            # Popravek za majhne vrednosti (linear counting)
+            return self.m * math.log(self.m / zeros)
+        return raw
+
+    def to_bytes(self):
+        return bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data, precision=12):
+        return cls(precision, data)